@@ -19,6 +19,7 @@ class RandomAgent:
         self.game = game
 
     def calculate_action(self, *arg, **kwargs):
+        legal_actions = self.game.legal_actions(self.player_id)
         while 1:
             rand = random.random()
             val = None
@@ -40,7 +41,7 @@ class RandomAgent:
                     action = ActionType.ALL_IN
                     val = None
 
-            if self.game.validate_move(self.player_id, action, val):
+            if legal_actions.is_legal(action, val):
                 break
         return action, val
 
@@ -86,10 +87,11 @@ class RLAgent:
         else:
             val = None
 
-        if not self.game.validate_move(self.player_id, action, val):
+        legal_actions = self.game.legal_actions(self.player_id)
+        if not legal_actions.is_legal(action, val):
             action = (
                 ActionType.CHECK
-                if self.game.validate_move(self.player_id, ActionType.CHECK, None)
+                if legal_actions.is_legal(ActionType.CHECK)
                 else ActionType.FOLD
             )
             val = None
@@ -136,13 +138,14 @@ class CrammerAgent:
         # CHECK and CALL may sometimes be invalid.
         # I don't believe CHECK and CALL can ever be simultaneously possible.
         possible_actions = []  # 3 in length.
+        legal_actions = self.game.legal_actions(curr_player_id)
         for action in self.num_to_action.values():
             if action.name == "RAISE":
                 val = int((self.game.big_blind + curr_player_chips) / 2)
             else:
                 val = None
 
-            if self.game.validate_move(curr_player_id, action, val):
+            if legal_actions.is_legal(action, val):
                 possible_actions.append(action.name)
 
             # All other hand phases besides PREFLOP.
@@ -0,0 +1,3 @@
+"""The abstraction package. Includes the card abstraction bucket tables."""
+
+from engine.abstraction.buckets import BucketTable, get_bucket_table
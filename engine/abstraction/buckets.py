@@ -0,0 +1,562 @@
+"""
+The buckets module groups the hands of every street into a small number of
+buckets of similar strength (card abstraction), so that a strategy can be
+learned per bucket instead of per exact hand and board.
+
+Every hand on every board, up to suit isomorphism (see
+:func:`engine.evaluator.isomorphism.canonical_boards`), is described by how
+strong it ends up on the river:
+    river    => its hand strength against one random hand
+    turn     => the histogram of its river strength over the 46 river cards
+    flop     => the histogram of its river strength over every turn and river
+    preflop  => the histogram of its river strength over every board, shared
+                by the hands of a starting hand class
+The histograms are compared as cumulative distributions, where the euclidean
+distance follows the earth mover's distance between them, and every street
+is clustered with k-means. Buckets are numbered from the weakest to the
+strongest.
+
+The tables are generated once by running this module::
+
+    python -m engine.abstraction.buckets --processes 8
+
+and saved to a checksummed binary file that is memory mapped on first use
+(see :func:`get_bucket_table`). A hand is then bucketed with one lookup of its
+board's row and its combo's column. The river table has a row for each of the
+134,459 canonical rivers, about 180 MB with the other streets.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+import numpy as np
+
+from engine.card.card import Card
+from engine.card.card_index import from_indices, to_indices
+from engine.card.card_set import CardSet
+from engine.equity.ranges import NUM_COMBOS, get_combo_tables, river_strengths
+from engine.evaluator.isomorphism import (
+    SUIT_PERMUTATIONS,
+    canonical_board_codes,
+    canonical_boards,
+    get_cache,
+)
+from engine.evaluator.preflop import hand_class
+
+BUCKET_TABLE_PATH = os.environ.get(
+    "POKER_BUCKET_TABLE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "bucket_table.bin"),
+)
+"""Where the tables are saved, can be set with the POKER_BUCKET_TABLE
+environment variable."""
+
+STREETS = (0, 3, 4, 5)
+"""The number of board cards on every street, the order of the tables."""
+
+MAX_BUCKETS = 256
+
+_FILE_MAGIC = b"PKBK"
+_FILE_VERSION = 1
+_FILE_HEADER = struct.Struct("=4sIII")
+_STREET_HEADER = struct.Struct("=II")
+
+
+class BucketTableFileError(Exception):
+    """
+    BucketTable will throw this error if a table file has the wrong version,
+    size or does not match its checksum.
+    """
+
+
+def _canonical_board(board: Tuple[int, ...]) -> Tuple[int, Tuple[int, ...]]:
+    """
+    Returns:
+        Tuple[int, Tuple[int, ...]]: The canonical code of the board and the
+            suit permutation taking the board to it
+    """
+    codes, perm_ids = canonical_board_codes(np.array([board], dtype=np.int64).reshape(1, -1))
+    return int(codes[0]), tuple(SUIT_PERMUTATIONS[perm_ids[0]].tolist())
+
+
+@dataclass(frozen=True)
+class BucketTable:
+    """The bucket tables of every street, see the module docstring."""
+
+    codes: Tuple[np.ndarray, ...]
+    """For every street, the sorted canonical codes of its boards."""
+
+    buckets: Tuple[np.ndarray, ...]
+    """For every street, the (boards, 1326) ``uint8`` bucket of every combo on
+    every board."""
+
+    num_buckets: Tuple[int, ...]
+    """The number of buckets of every street."""
+
+    def bucket(self, hole_cards: List[Card], board: List[Card]) -> int:
+        """
+        Arguments:
+            hole_cards (List[Card]): The two hole cards
+            board (List[Card]): The 0, 3, 4 or 5 board cards
+        Returns:
+            int: The bucket of the hand on the street of the board
+        Raises:
+            ValueError: If the number of cards is not supported
+        """
+        if len(hole_cards) != 2:
+            raise ValueError("Exactly two hole cards are needed")
+        if len(board) not in STREETS:
+            raise ValueError(f"Board must have 0, 3, 4 or 5 cards, got {len(board)}")
+
+        street = STREETS.index(len(board))
+        board_indices = tuple(sorted(to_indices(board)))
+        code, perm = get_cache("bucket_boards").get_or_compute(
+            board_indices, lambda: _canonical_board(board_indices)
+        )
+        row = np.searchsorted(self.codes[street], code)
+        first, second = sorted(
+            4 * (index // 4) + perm[index % 4] for index in to_indices(hole_cards)
+        )
+        return int(self.buckets[street][row, get_combo_tables().index[first, second]])
+
+    def save(self, path: Union[str, os.PathLike]):
+        """
+        Writes the tables to the given file, under a temporary name that is
+        then moved into place.
+
+        Arguments:
+            path (Union[str, os.PathLike]): The file to write the tables to
+        """
+        parts = [
+            _STREET_HEADER.pack(len(codes), num_buckets)
+            for codes, num_buckets in zip(self.codes, self.num_buckets)
+        ]
+        parts += [codes.astype("<i8").tobytes() for codes in self.codes]
+        parts += [buckets.astype(np.uint8).tobytes() for buckets in self.buckets]
+        body = b"".join(parts)
+        header = _FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, zlib.crc32(body), len(body))
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(header)
+                file.write(body)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def from_file(cls, path: Union[str, os.PathLike]) -> BucketTable:
+        """
+        Memory maps the tables saved by :meth:`save`.
+
+        Arguments:
+            path (Union[str, os.PathLike]): The file to read the tables from
+        Returns:
+            BucketTable: Read-only tables backed by the file
+        Raises:
+            OSError: If the file cannot be opened
+            BucketTableFileError: If the file is not a valid table file of this version
+        """
+        with open(path, "rb") as file:
+            try:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as err:  # empty file
+                raise BucketTableFileError(f"Empty bucket table file {path}") from err
+
+        offset = _FILE_HEADER.size + len(STREETS) * _STREET_HEADER.size
+        if len(mapping) < offset:
+            raise BucketTableFileError(f"Bucket table file {path} has the wrong size")
+
+        magic, version, checksum, size = _FILE_HEADER.unpack(mapping[: _FILE_HEADER.size])
+        if magic != _FILE_MAGIC or version != _FILE_VERSION:
+            raise BucketTableFileError(
+                f"Bucket table file {path} has version {version}, expected {_FILE_VERSION}"
+            )
+
+        streets = [
+            _STREET_HEADER.unpack_from(mapping, _FILE_HEADER.size + i * _STREET_HEADER.size)
+            for i in range(len(STREETS))
+        ]
+        num_boards = [street[0] for street in streets]
+        if len(mapping) != _FILE_HEADER.size + size or size != (
+            len(STREETS) * _STREET_HEADER.size + sum(num_boards) * (8 + NUM_COMBOS)
+        ):
+            raise BucketTableFileError(f"Bucket table file {path} has the wrong size")
+        if zlib.crc32(memoryview(mapping)[_FILE_HEADER.size :]) != checksum:
+            raise BucketTableFileError(f"Checksum mismatch in bucket table file {path}")
+
+        codes = []
+        for count in num_boards:
+            codes.append(np.frombuffer(mapping, dtype="<i8", count=count, offset=offset))
+            offset += 8 * count
+        buckets = []
+        for count in num_boards:
+            buckets.append(
+                np.frombuffer(
+                    mapping, dtype=np.uint8, count=count * NUM_COMBOS, offset=offset
+                ).reshape(count, NUM_COMBOS)
+            )
+            offset += count * NUM_COMBOS
+        return cls(
+            codes=tuple(codes),
+            buckets=tuple(buckets),
+            num_buckets=tuple(street[1] for street in streets),
+        )
+
+
+_BUCKET_TABLE: Optional[BucketTable] = None
+_BUCKET_TABLE_LOADED = False
+
+
+def get_bucket_table() -> Optional[BucketTable]:
+    """
+    Returns:
+        Optional[BucketTable]: The shared bucket tables, loaded from
+            BUCKET_TABLE_PATH on the first call, or None if they have not
+            been generated.
+    """
+    global _BUCKET_TABLE, _BUCKET_TABLE_LOADED  # pylint: disable=global-statement
+    if not _BUCKET_TABLE_LOADED:
+        _BUCKET_TABLE_LOADED = True
+        try:
+            _BUCKET_TABLE = BucketTable.from_file(BUCKET_TABLE_PATH)
+        except (OSError, BucketTableFileError):
+            _BUCKET_TABLE = None
+    return _BUCKET_TABLE
+
+
+# generation
+
+
+def _river_histograms(
+    rivers: Iterable[Sequence[int]], bins: int, weights: Optional[Sequence[float]] = None
+) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: (1326, bins) for every combo, the (weighted) number of the
+            rivers on which its hand strength falls in each bin
+    """
+    weights = itertools.repeat(1.0) if weights is None else weights
+    counts = np.zeros(NUM_COMBOS * bins)
+    offsets = np.arange(NUM_COMBOS) * bins
+    for river, weight in zip(rivers, weights):
+        strengths = river_strengths(river)
+        live = ~np.isnan(strengths)
+        strength_bins = np.minimum((strengths[live] * bins).astype(np.int64), bins - 1)
+        counts += np.bincount(
+            offsets[live] + strength_bins, minlength=NUM_COMBOS * bins
+        ) * weight
+    return counts.reshape(NUM_COMBOS, bins)
+
+
+def _cumulative(counts: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: The histograms as cumulative distributions, NaN rows for
+            the empty ones
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.cumsum(counts, axis=-1) / counts.sum(axis=-1, keepdims=True)
+
+
+def _board_features(board: Sequence[int], bins: int) -> np.ndarray:
+    """
+    Arguments:
+        board (Sequence[int]): A flop, turn or river as deck indices
+        bins (int): The number of histogram bins
+    Returns:
+        np.ndarray: (1326, F) features of every combo on the board, NaN rows
+            for the combos sharing a card with it
+    """
+    board = [int(card) for card in board]
+    if len(board) == 5:
+        return river_strengths(board)[:, None]
+    rest = CardSet.from_indices(board).complement().indices()
+    rivers = (
+        board + list(cards) for cards in itertools.combinations(rest, 5 - len(board))
+    )
+    return _cumulative(_river_histograms(rivers, bins))
+
+
+def _sample_features(boards: np.ndarray, bins: int) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: The features of the dealable combos of every board stacked
+    """
+    features = [_board_features(board, bins) for board in boards]
+    return np.concatenate([rows[~np.isnan(rows[:, 0])] for rows in features])
+
+
+def _assign_boards(boards: np.ndarray, bins: int, centroids: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: (len(boards), 1326) ``uint8`` bucket of every combo on every
+            board, 0 for the combos sharing a card with it
+    """
+    buckets = np.zeros((len(boards), NUM_COMBOS), dtype=np.uint8)
+    for row, board in enumerate(boards):
+        features = _board_features(board, bins)
+        live = ~np.isnan(features[:, 0])
+        buckets[row, live] = assign_clusters(features[live], centroids)
+    return buckets
+
+
+def _star(args):
+    """Calls the first argument with the rest, for the process pool."""
+    return args[0](*args[1:])
+
+
+def _squared_distances(points: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.maximum(
+        (points**2).sum(axis=1)[:, None]
+        - 2 * points @ centroids.T
+        + (centroids**2).sum(axis=1)[None, :],
+        0.0,
+    )
+
+
+def assign_clusters(
+    points: np.ndarray, centroids: np.ndarray, chunk_size: int = 65536
+) -> np.ndarray:
+    """
+    Arguments:
+        points (np.ndarray): (N, F) points
+        centroids (np.ndarray): (K, F) cluster centers
+        chunk_size (int): How many points to compare at once
+    Returns:
+        np.ndarray: (N,) the index of the nearest center of every point
+    """
+    return np.concatenate(
+        [
+            _squared_distances(points[i : i + chunk_size], centroids).argmin(axis=1)
+            for i in range(0, len(points), chunk_size)
+        ]
+        or [np.zeros(0, dtype=np.int64)]
+    )
+
+
+def kmeans(
+    points: np.ndarray, num_clusters: int, iterations: int = 50, seed: Optional[int] = 0
+) -> np.ndarray:
+    """
+    Clusters the points with Lloyd's algorithm from a k-means++ start.
+
+    Arguments:
+        points (np.ndarray): (N, F) points
+        num_clusters (int): The number of clusters K
+        iterations (int): The most assignment and update steps to run
+        seed (Optional[int]): The random seed for the start, defaults to 0
+    Returns:
+        np.ndarray: (K, F) cluster centers
+    """
+    rng = np.random.default_rng(seed)
+    points = np.asarray(points, dtype=np.float64)
+
+    # k-means++: every next center is drawn in proportion to the squared
+    # distance to the nearest one so far
+    centroids = points[[rng.integers(len(points))]]
+    closest = _squared_distances(points, centroids)[:, 0]
+    for _ in range(1, num_clusters):
+        total = closest.sum()
+        choice = (
+            rng.choice(len(points), p=closest / total)
+            if total > 0
+            else rng.integers(len(points))
+        )
+        centroids = np.r_[centroids, points[[choice]]]
+        closest = np.minimum(closest, _squared_distances(points, centroids[-1:])[:, 0])
+
+    labels = None
+    for _ in range(iterations):
+        new_labels = assign_clusters(points, centroids)
+        if labels is not None and (new_labels == labels).all():
+            break
+        labels = new_labels
+
+        counts = np.bincount(labels, minlength=num_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, points)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # an empty cluster restarts at the point farthest from its center
+        for cluster in np.flatnonzero(~filled):
+            distances = ((points - centroids[labels]) ** 2).sum(axis=1)
+            centroids[cluster] = points[distances.argmax()]
+            labels[distances.argmax()] = cluster
+    return centroids
+
+
+def _sorted_by_strength(centroids: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: The centers from the weakest to the strongest, by hand
+            strength or by the area under the cumulative distribution
+    """
+    if centroids.shape[1] == 1:
+        return centroids[np.argsort(centroids[:, 0], kind="stable")]
+    return centroids[np.argsort(-centroids.sum(axis=1), kind="stable")]
+
+
+def _map(function, tasks: List[tuple], processes: int) -> list:
+    tasks = [(function,) + task for task in tasks]
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            return list(pool.map(_star, tasks))
+    return list(map(_star, tasks))
+
+
+def build_preflop_buckets(
+    num_buckets: int, bins: int = 20, processes: int = 1, chunk_size: int = 2000
+) -> np.ndarray:
+    """
+    Arguments:
+        num_buckets (int): The number of preflop buckets
+        bins (int): The number of histogram bins
+        processes (int): How many processes to use, defaults to 1 (no pool)
+        chunk_size (int): How many canonical rivers each task goes through
+    Returns:
+        np.ndarray: (1, 1326) bucket of every combo
+    """
+    rivers, weights, _ = canonical_boards(5)
+    tasks = [
+        (rivers[i : i + chunk_size], bins, weights[i : i + chunk_size])
+        for i in range(0, len(rivers), chunk_size)
+    ]
+    counts = sum(_map(_river_histograms, tasks, processes))
+
+    # the canonical rivers are not symmetric for each combo, only for the
+    # combos of a class together
+    classes = np.array(
+        [hand_class(from_indices(combo)) for combo in get_combo_tables().combos.tolist()]
+    )
+    class_counts = np.zeros((classes.max() + 1, bins))
+    np.add.at(class_counts, classes, counts)
+    features = _cumulative(class_counts)[classes]
+
+    centroids = _sorted_by_strength(kmeans(features, num_buckets))
+    return assign_clusters(features, centroids).astype(np.uint8)[None, :]
+
+
+def build_street_buckets(
+    num_cards: int,
+    num_buckets: int,
+    bins: int = 20,
+    fit_boards: int = 200,
+    processes: int = 1,
+    chunk_size: int = 50,
+    seed: Optional[int] = 0,
+    boards: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Clusters the hands of a sample of the boards of a street, then buckets
+    every hand on every board with the resulting centers. The features of the
+    whole street would not fit in memory, so they are computed again, a chunk
+    of boards at a time, for the buckets.
+
+    Arguments:
+        num_cards (int): The number of board cards, 3, 4 or 5
+        num_buckets (int): The number of buckets
+        bins (int): The number of histogram bins
+        fit_boards (int): How many boards to cluster on
+        processes (int): How many processes to use, defaults to 1 (no pool)
+        chunk_size (int): How many boards each task goes through
+        seed (Optional[int]): The random seed for the sample and k-means
+        boards (Optional[np.ndarray]): Only these canonical boards, defaults to all
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The sorted canonical codes of the boards and
+            their (boards, 1326) buckets
+    """
+    if boards is None:
+        boards, _, codes = canonical_boards(num_cards)
+    else:
+        codes = canonical_board_codes(boards)[0]
+        order = np.argsort(codes)
+        boards, codes = boards[order], codes[order]
+
+    rng = np.random.default_rng(seed)
+    sample = boards[rng.choice(len(boards), min(fit_boards, len(boards)), replace=False)]
+    tasks = [(sample[i : i + chunk_size], bins) for i in range(0, len(sample), chunk_size)]
+    features = np.concatenate(_map(_sample_features, tasks, processes))
+    centroids = _sorted_by_strength(kmeans(features, num_buckets, seed=seed))
+
+    tasks = [
+        (boards[i : i + chunk_size], bins, centroids)
+        for i in range(0, len(boards), chunk_size)
+    ]
+    return codes, np.concatenate(_map(_assign_boards, tasks, processes))
+
+
+def build_bucket_table(
+    num_buckets: Sequence[int] = (20, 50, 50, 50),
+    bins: int = 20,
+    fit_boards: int = 200,
+    processes: int = 1,
+    seed: Optional[int] = 0,
+) -> BucketTable:
+    """
+    Arguments:
+        num_buckets (Sequence[int]): The number of buckets of every street
+        bins (int): The number of histogram bins
+        fit_boards (int): How many boards of every postflop street to cluster on
+        processes (int): How many processes to use, defaults to 1 (no pool)
+        seed (Optional[int]): The random seed for the samples and k-means
+    Returns:
+        BucketTable: Freshly generated tables
+    Raises:
+        ValueError: If a street has too many buckets
+    """
+    if len(num_buckets) != len(STREETS) or not all(
+        0 < count <= MAX_BUCKETS for count in num_buckets
+    ):
+        raise ValueError(f"Need 1 to {MAX_BUCKETS} buckets for each of the {len(STREETS)} streets")
+
+    codes = [np.zeros(1, dtype=np.int64)]
+    buckets = [build_preflop_buckets(num_buckets[0], bins, processes)]
+    for num_cards, count in zip(STREETS[1:], num_buckets[1:]):
+        street_codes, street_buckets = build_street_buckets(
+            num_cards, count, bins, fit_boards, processes, seed=seed
+        )
+        codes.append(street_codes)
+        buckets.append(street_buckets)
+    return BucketTable(
+        codes=tuple(codes), buckets=tuple(buckets), num_buckets=tuple(num_buckets)
+    )
+
+
+def main():
+    """Generates the bucket table file."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--output", default=BUCKET_TABLE_PATH)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--buckets",
+        type=int,
+        nargs=len(STREETS),
+        default=[20, 50, 50, 50],
+        help="The number of preflop, flop, turn and river buckets",
+    )
+    parser.add_argument("--bins", type=int, default=20)
+    parser.add_argument("--fit-boards", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    build_bucket_table(
+        args.buckets, args.bins, args.fit_boards, args.processes, args.seed
+    ).save(args.output)
+
+
+if __name__ == "__main__":
+    main()
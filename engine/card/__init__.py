@@ -1,6 +1,9 @@
 """
-The card package. Includes the card and deck module.
+The card package. Includes the card, card index, card set, deck and deal stream module.
 """
 
 from engine.card.card import Card
+from engine.card import card_index
+from engine.card.card_set import CardSet
 from engine.card.deck import Deck
+from engine.card.deal_stream import DealStream
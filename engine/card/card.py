@@ -294,7 +294,7 @@ def prime_product_from_hand(cards: Iterable[Card]) -> int:
         int: The product of all primes in the hand, corresponding to the rank of the
             card (See :meth:`Card.prime`)
     """
-    return math.prod(card.prime for card in cards)
+    return math.prod(card & 0x3F for card in cards)
 
 
 def prime_product_from_rankbits(rankbits: int) -> int:
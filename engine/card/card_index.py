@@ -0,0 +1,156 @@
+"""
+The card index module is a compact alternative to the 32-bit :class:`Card`:
+every card is a number from 0 to 51 (fits a ``uint8``), in the order of the
+full deck (see :meth:`Deck._get_full_deck`)::
+
+    index = 4 * rank + suit_index    (suit_index 0-3 for s, h, d, c)
+
+The attributes of every index are looked up in precomputed tables instead of
+being shifted and masked out of the card int on every access. The tables come
+as tuples, for plain Python code, and as read-only NumPy arrays, for indexing
+whole arrays of cards at once. The arrays (:data:`CARDS`, :data:`RANKS`,
+:data:`SUITS`, :data:`PRIMES` and :data:`BITRANKS`) are built on first access,
+so importing the card package doesn't import NumPy.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+from engine.card.card import Card
+
+if TYPE_CHECKING:
+    import numpy as np
+
+NUM_CARDS = 52
+
+INDEX_TO_CARD = tuple(
+    Card(rank + suit) for rank in Card.STR_RANKS for suit in Card.CHAR_SUIT_TO_INT_SUIT
+)
+"""Index => :class:`Card`"""
+
+INDEX_TO_RANK = tuple(card.rank for card in INDEX_TO_CARD)
+"""Index => rank (0-12)"""
+
+INDEX_TO_SUIT = tuple(card.suit for card in INDEX_TO_CARD)
+"""Index => suit int (1, 2, 4, 8), as :attr:`Card.suit`"""
+
+INDEX_TO_PRIME = tuple(card.prime for card in INDEX_TO_CARD)
+"""Index => prime of the rank"""
+
+INDEX_TO_BITRANK = tuple(card.bitrank for card in INDEX_TO_CARD)
+"""Index => bitrank (2^rank)"""
+
+CARD_TO_INDEX = {int(card): index for index, card in enumerate(INDEX_TO_CARD)}
+"""Card int => index"""
+
+
+_ARRAYS: Optional[Dict[str, np.ndarray]] = None
+
+
+def _get_arrays() -> Dict[str, np.ndarray]:
+    """
+    Returns:
+        Dict[str, np.ndarray]: The tables as read-only NumPy arrays by name,
+            built on the first call
+    """
+    global _ARRAYS  # pylint: disable=global-statement
+    if _ARRAYS is None:
+        # pylint: disable=import-outside-toplevel
+        import numpy as np
+
+        def read_only(values, dtype) -> np.ndarray:
+            array = np.array(values, dtype=dtype)
+            array.flags.writeable = False
+            return array
+
+        _ARRAYS = {
+            # the card ints, indexed by card index
+            "CARDS": read_only(INDEX_TO_CARD, np.int64),
+            "RANKS": read_only(INDEX_TO_RANK, np.uint8),
+            "SUITS": read_only(INDEX_TO_SUIT, np.uint8),
+            "PRIMES": read_only(INDEX_TO_PRIME, np.uint8),
+            "BITRANKS": read_only(INDEX_TO_BITRANK, np.uint16),
+            # suit int (1, 2, 4, 8) => suit index (0-3)
+            "_SUIT_INDEX": read_only([0, 0, 1, 0, 2, 0, 0, 0, 3], np.int64),
+        }
+    return _ARRAYS
+
+
+def __getattr__(name: str):
+    # the NumPy tables are kept as module attributes, built when first accessed
+    if name in ("CARDS", "RANKS", "SUITS", "PRIMES", "BITRANKS"):
+        return _get_arrays()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def to_index(card: Card) -> int:
+    """
+    Arguments:
+        card (Card): A card
+    Returns:
+        int: The index of the card, 0 to 51
+    """
+    return CARD_TO_INDEX[card]
+
+
+def from_index(index: int) -> Card:
+    """
+    Arguments:
+        index (int): A card index, 0 to 51
+    Returns:
+        Card: The card
+    """
+    return INDEX_TO_CARD[index]
+
+
+def to_indices(cards: Iterable[Card]) -> List[int]:
+    """
+    Arguments:
+        cards (Iterable[Card]): Some cards
+    Returns:
+        List[int]: The index of every card
+    """
+    return [CARD_TO_INDEX[card] for card in cards]
+
+
+def from_indices(indices: Iterable[int]) -> List[Card]:
+    """
+    Arguments:
+        indices (Iterable[int]): Some card indices
+    Returns:
+        List[Card]: The cards
+    """
+    return [INDEX_TO_CARD[index] for index in indices]
+
+
+def cards_to_indices(cards: np.ndarray) -> np.ndarray:
+    """
+    The vectorized :func:`to_index`, computed from the rank and suit bits.
+
+    Arguments:
+        cards (np.ndarray): An array of card ints
+    Returns:
+        np.ndarray: A ``uint8`` array of the same shape with the card indices
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    cards = np.asarray(cards, dtype=np.int64)
+    suit_index = _get_arrays()["_SUIT_INDEX"]
+    return (((cards >> 8) & 0xF) * 4 + suit_index[(cards >> 12) & 0xF]).astype(np.uint8)
+
+
+def indices_to_cards(indices: np.ndarray) -> np.ndarray:
+    """
+    The vectorized :func:`from_index`.
+
+    Arguments:
+        indices (np.ndarray): An array of card indices
+    Returns:
+        np.ndarray: An ``int64`` array of the same shape with the card ints
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    return _get_arrays()["CARDS"][np.asarray(indices, dtype=np.intp)]
@@ -0,0 +1,178 @@
+"""
+The card set module represents a set of cards as a single 52-bit integer,
+one bit per card index (see :mod:`engine.card.card_index`). Union,
+intersection, membership and counting are single integer operations instead
+of list scans, which makes dead card checks cheap.
+
+For many sets at once, the same masks are kept in NumPy ``uint64`` arrays,
+see :func:`masks_from_indices` and :func:`popcount_many`. NumPy is only
+imported by those two, so the card set itself stays cheap to import.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Union
+
+from engine.card.card import Card
+from engine.card.card_index import CARD_TO_INDEX, INDEX_TO_CARD, NUM_CARDS
+
+if TYPE_CHECKING:
+    import numpy as np
+
+FULL_MASK = (1 << NUM_CARDS) - 1
+
+
+class CardSet:
+    """
+    An immutable set of cards backed by a 52-bit mask. Iterating yields the
+    cards in deck order.
+    """
+
+    __slots__ = ("mask",)
+
+    def __init__(self, mask: int = 0):
+        """
+        Arguments:
+            mask (int): The 52-bit mask, bit i set for card index i
+        """
+        self.mask = mask
+
+    @classmethod
+    def from_cards(cls, cards: Iterable[Card]) -> CardSet:
+        """
+        Arguments:
+            cards (Iterable[Card]): The cards
+        Returns:
+            CardSet: The set of the cards
+        Raises:
+            ValueError: If a card appears twice
+        """
+        mask = 0
+        for card in cards:
+            bit = 1 << CARD_TO_INDEX[card]
+            if mask & bit:
+                raise ValueError(f"Card {Card(card)} appears more than once")
+            mask |= bit
+        return cls(mask)
+
+    @classmethod
+    def from_indices(cls, indices: Iterable[int]) -> CardSet:
+        """
+        Arguments:
+            indices (Iterable[int]): The card indices, 0 to 51
+        Returns:
+            CardSet: The set of the cards
+        """
+        mask = 0
+        for index in indices:
+            mask |= 1 << index
+        return cls(mask)
+
+    @classmethod
+    def full(cls) -> CardSet:
+        """
+        Returns:
+            CardSet: All 52 cards
+        """
+        return cls(FULL_MASK)
+
+    def indices(self) -> List[int]:
+        """
+        Returns:
+            List[int]: The card indices in the set, in deck order
+        """
+        indices = []
+        mask = self.mask
+        while mask:
+            low_bit = mask & -mask
+            indices.append(low_bit.bit_length() - 1)
+            mask ^= low_bit
+        return indices
+
+    def to_cards(self) -> List[Card]:
+        """
+        Returns:
+            List[Card]: The cards in the set, in deck order
+        """
+        return [INDEX_TO_CARD[index] for index in self.indices()]
+
+    def complement(self) -> CardSet:
+        """
+        Returns:
+            CardSet: Every card not in this set
+        """
+        return CardSet(FULL_MASK & ~self.mask)
+
+    def isdisjoint(self, other: CardSet) -> bool:
+        """
+        Returns:
+            bool: If the two sets have no card in common
+        """
+        return not self.mask & other.mask
+
+    def __or__(self, other: CardSet) -> CardSet:
+        return CardSet(self.mask | other.mask)
+
+    def __and__(self, other: CardSet) -> CardSet:
+        return CardSet(self.mask & other.mask)
+
+    def __sub__(self, other: CardSet) -> CardSet:
+        return CardSet(self.mask & ~other.mask)
+
+    def __contains__(self, card: Union[Card, int]) -> bool:
+        # a Card is an int as well, so only card ints are looked up
+        index = CARD_TO_INDEX.get(card, card)
+        return bool(self.mask >> index & 1)
+
+    def __len__(self) -> int:
+        return bin(self.mask).count("1")
+
+    def __iter__(self) -> Iterator[Card]:
+        return iter(self.to_cards())
+
+    def __bool__(self) -> bool:
+        return bool(self.mask)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CardSet) and self.mask == other.mask
+
+    def __hash__(self) -> int:
+        return hash(self.mask)
+
+    def __repr__(self) -> str:
+        return f"CardSet({[str(card) for card in self]})"
+
+
+def masks_from_indices(indices: np.ndarray) -> np.ndarray:
+    """
+    Arguments:
+        indices (np.ndarray): An (N, k) array of card indices, no index twice in a row
+    Returns:
+        np.ndarray: The (N,) ``uint64`` card set masks of the rows
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    indices = np.asarray(indices, dtype=np.uint64)
+    return (np.uint64(1) << indices).sum(axis=-1, dtype=np.uint64)
+
+
+def popcount_many(masks: np.ndarray) -> np.ndarray:
+    """
+    Arguments:
+        masks (np.ndarray): An array of ``uint64`` card set masks
+    Returns:
+        np.ndarray: The number of cards in every set
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    masks = np.asarray(masks, dtype=np.uint64)
+    byte_popcount = np.array(_BYTE_POPCOUNT, dtype=np.int64)
+    counts = np.zeros(masks.shape, dtype=np.int64)
+    for byte in range(7):
+        counts += byte_popcount[(masks >> np.uint64(8 * byte)) & np.uint64(0xFF)]
+    return counts
+
+
+_BYTE_POPCOUNT = tuple(bin(i).count("1") for i in range(256))
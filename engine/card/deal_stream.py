@@ -0,0 +1,138 @@
+"""
+The deal stream module hands out shuffled decks for simulations that play
+millions of hands. Whole batches of decks are shuffled at once with NumPy
+(an argsort of random keys per row) into a ring buffer of batches, which a
+background thread refills while the game plays through the current one.
+
+All batches come from one seeded generator, in order, so a seed reproduces
+the card sequence of a whole run no matter how the refill thread is timed.
+NumPy is imported when the first stream is created, so the card package
+stays cheap to import.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Optional
+import queue
+import threading
+
+from engine.card.card_index import INDEX_TO_CARD, NUM_CARDS
+from engine.card.deck import Deck
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class DealStream:
+    """
+    An endless stream of shuffled decks, see the module docstring.
+    Call :meth:`close` (or use it as a context manager) to stop the refill
+    thread.
+    """
+
+    def __init__(
+        self,
+        seed: Optional[int] = None,
+        batch_size: int = 4096,
+        num_batches: int = 4,
+        background: bool = True,
+    ):
+        """
+        Arguments:
+            seed (Optional[int]): The seed of the shuffles, defaults to fresh entropy
+            batch_size (int): How many decks are shuffled at once
+            num_batches (int): How many batches the ring buffer holds, at least 2
+            background (bool): If the batches are refilled on a background thread,
+                defaults to True. Otherwise a batch is shuffled when the stream
+                runs out of decks.
+        Raises:
+            ValueError: If the sizes are not valid
+        """
+        if batch_size < 1 or num_batches < 2:
+            raise ValueError("Need a batch size of at least 1 and at least 2 batches")
+
+        # pylint: disable=import-outside-toplevel
+        import numpy as np
+
+        self.seed = seed
+        self.batch_size = batch_size
+        self._rng = np.random.default_rng(seed)
+        self._buffer = np.empty((num_batches, batch_size, NUM_CARDS), dtype=np.uint8)
+
+        # slots of the ring buffer waiting to be shuffled / to be dealt from
+        self._free: queue.Queue = queue.Queue()
+        self._filled: queue.Queue = queue.Queue()
+        for slot in range(num_batches):
+            self._free.put(slot)
+
+        self._slot: Optional[int] = None
+        self._row = batch_size
+
+        self._thread: Optional[threading.Thread] = None
+        if background:
+            self._thread = threading.Thread(
+                target=self._refill, name="DealStream", daemon=True
+            )
+            self._thread.start()
+
+    def _shuffle(self, slot: int):
+        # pylint: disable=import-outside-toplevel
+        import numpy as np
+
+        self._buffer[slot] = np.argsort(
+            self._rng.random((self.batch_size, NUM_CARDS)), axis=1
+        )
+
+    def _refill(self):
+        """Shuffles every freed slot until :meth:`close` sends None."""
+        while True:
+            slot = self._free.get()
+            if slot is None:
+                return
+            self._shuffle(slot)
+            self._filled.put(slot)
+
+    def next_order(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: The next shuffled deck as the (52,) ``uint8`` card indices
+                in dealing order. This is a view into the ring buffer, valid until
+                the stream moves on to another batch, copy it to keep it.
+        """
+        if self._row == self.batch_size:
+            if self._slot is not None:
+                self._free.put(self._slot)
+            if self._thread is None:
+                # batches shuffled before close() come first, to keep the order
+                try:
+                    slot = self._filled.get_nowait()
+                except queue.Empty:
+                    slot = self._free.get_nowait()
+                    self._shuffle(slot)
+            else:
+                slot = self._filled.get()
+            self._slot, self._row = slot, 0
+
+        order = self._buffer[self._slot, self._row]
+        self._row += 1
+        return order
+
+    def next_deck(self) -> Deck:
+        """
+        Returns:
+            Deck: A deck dealing the cards of :meth:`next_order`
+        """
+        return Deck.from_order([INDEX_TO_CARD[index] for index in self.next_order().tolist()])
+
+    def close(self):
+        """Stops the refill thread."""
+        if self._thread is not None:
+            self._free.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> DealStream:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,33 +1,158 @@
-"""The deck module"""
+"""
+The deck module. A deck keeps all 52 cards in one buffer and a cursor to
+the next card to deal. The buffer is shuffled lazily with Fisher-Yates: each
+card dealt swaps one random card of the rest into its position, so a hand
+only costs as many random draws as it deals cards.
+"""
 
-from typing import List
+from typing import TYPE_CHECKING, Callable, List, Union
 
+import functools
+import numbers
 import random
+import sys
+
 from engine.card import card
 from engine.card.card import Card
+from engine.card.card_index import to_indices
+from engine.card.card_set import CardSet
+
+if TYPE_CHECKING:
+    import numpy as np
+
+RandomSource = Union[None, int, random.Random, "np.random.Generator"]
+"""A seed or random generator for a :class:`Deck`."""
+
+# the first positions of the buffer hold the community cards
+_NUM_COMMUNITY_CARDS = 5
+
+
+def _generator_randbelow(rng: "np.random.Generator", n: int) -> int:
+    return int(rng.integers(n))
+
+
+def _randbelow(rng: RandomSource) -> Callable[[int], int]:
+    """
+    Arguments:
+        rng (RandomSource): None for the global :mod:`random` module, a seed
+            or a generator
+    Returns:
+        Callable[[int], int]: Draws a uniform int in [0, n)
+    Raises:
+        TypeError: If the rng is none of the supported types
+    """
+    if rng is None:
+        return random.randrange
+    if isinstance(rng, numbers.Integral) and not isinstance(rng, bool):
+        return random.Random(int(rng)).randrange
+    if isinstance(rng, random.Random):
+        return rng.randrange
+    # a numpy Generator can only exist if numpy is already imported
+    numpy = sys.modules.get("numpy")
+    if numpy is not None and isinstance(rng, numpy.random.Generator):
+        return functools.partial(_generator_randbelow, rng)
+    raise TypeError(f"Expected a seed, random.Random or numpy Generator, got {type(rng)}")
 
 
 class Deck:
     """
     Class representing a deck. The first time we create, we seed the static
-    deck with the list of unique card integers. Each object instantiated simply
-    makes a copy of this object and shuffles it.
+    deck with the list of unique card integers. Each object instantiated
+    makes a copy of this object and deals the five community cards from it.
     """
 
     _FULL_DECK: List[Card] = []
 
-    def __init__(self):
-        self.cards = Deck._get_full_deck()
-        self.shuffle()
-        self.community_cards = self.cards[:5]
-        self.cards = self.cards[5:]
+    def __init__(self, rng: RandomSource = None):
+        """
+        Arguments:
+            rng (RandomSource): The seed or generator to shuffle with, defaults
+                to the global :mod:`random` module. The same seed deals the same
+                cards in the same order.
+        """
+        self.seed = rng if isinstance(rng, int) else None
+        self._randbelow = _randbelow(rng)
+        self._buffer = Deck._get_full_deck()
+
+        # positions before _shuffled are in their final (dealing) order
+        self._shuffled = 0
+        self._shuffle_to(_NUM_COMMUNITY_CARDS)
+        self._community_cursor = 0
+        self._cursor = _NUM_COMMUNITY_CARDS
+
+    @classmethod
+    def from_order(cls, cards: List[Card]) -> "Deck":
+        """
+        Arguments:
+            cards (List[Card]): All 52 cards, already shuffled: the five community
+                cards first, then the cards in the order they are dealt
+        Returns:
+            Deck: A deck dealing the cards in the given order
+        """
+        deck = cls.__new__(cls)
+        deck.seed = None
+        deck._randbelow = _randbelow(None)
+        deck._buffer = list(cards)
+        deck._shuffled = len(deck._buffer)
+        deck._community_cursor = 0
+        deck._cursor = _NUM_COMMUNITY_CARDS
+        return deck
+
+    def copy(self) -> "Deck":
+        """
+        Returns:
+            Deck: A deck dealing the same cards from the same position. The
+                random source is shared, so the part of the buffer not shuffled
+                yet (see :meth:`_shuffle_to`) can come out differently in each.
+        """
+        deck = Deck.__new__(Deck)
+        deck.seed = self.seed
+        deck._randbelow = self._randbelow
+        deck._buffer = list(self._buffer)
+        deck._shuffled = self._shuffled
+        deck._community_cursor = self._community_cursor
+        deck._cursor = self._cursor
+        return deck
+
+    def _shuffle_to(self, end: int):
+        """Fixes the random order of the buffer up to the given position."""
+        buffer = self._buffer
+        randbelow = self._randbelow
+        for i in range(self._shuffled, end):
+            j = i + randbelow(len(buffer) - i)
+            buffer[i], buffer[j] = buffer[j], buffer[i]
+        self._shuffled = max(self._shuffled, end)
+
+    @property
+    def cards(self) -> List[Card]:
+        """
+        Returns:
+            List[Card]: The cards left in the deck in the order they will be
+                dealt, not counting the community cards
+        """
+        self._shuffle_to(len(self._buffer))
+        return self._buffer[self._cursor :]
+
+    @cards.setter
+    def cards(self, cards: List[Card]):
+        # stacks the deck, the given cards are dealt in their order
+        self._buffer[self._cursor :] = cards
+        self._shuffled = len(self._buffer)
+
+    @property
+    def community_cards(self) -> List[Card]:
+        """
+        Returns:
+            List[Card]: The community cards not dealt yet
+        """
+        return self._buffer[self._community_cursor : _NUM_COMMUNITY_CARDS]
 
     def shuffle(self) -> None:
         """
         Shuffles the remaining cards in the deck.
 
         """
-        random.shuffle(self.cards)
+        self._shuffled = self._cursor
 
     def draw(self, num=1, draw_from_community=False) -> List[Card]:
         """
@@ -41,17 +166,55 @@ class Deck:
             ValueError: If the deck size is less than the given n.
 
         """
-        if len(self.cards) < num:
-            raise ValueError(
-                f"Cannot draw {num} cards from deck of size {len(self.cards)}"
-            )
         if draw_from_community:
-            cards = self.community_cards[:num]
-            self.community_cards = self.community_cards[num:]
+            start, end = self._community_cursor, _NUM_COMMUNITY_CARDS
+        else:
+            start, end = self._cursor, len(self._buffer)
+        if end - start < num:
+            raise ValueError(f"Cannot draw {num} cards from deck of size {end - start}")
+
+        if draw_from_community:
+            self._community_cursor += num
         else:
-            cards = self.cards[:num]
-            self.cards = self.cards[num:]
-        return cards
+            self._cursor += num
+            self._shuffle_to(self._cursor)
+        return self._buffer[start : start + num]
+
+    def draw_indices(self, num=1, draw_from_community=False) -> List[int]:
+        """
+        :meth:`draw` for the compact card representation.
+
+        Args:
+            num (int): How many cards to draw. Defaults to 1.
+        Returns:
+           list[int]: The indices (0 to 51) of the cards drawn (See :mod:`card_index`).
+        Raises:
+            ValueError: If the deck size is less than the given n.
+
+        """
+        return to_indices(self.draw(num, draw_from_community))
+
+    def card_set(self) -> CardSet:
+        """
+        Returns:
+            CardSet: The cards left in the deck, not counting the community cards
+        """
+        return CardSet.from_cards(self._buffer[self._cursor :])
+
+    def remove(self, dead: CardSet) -> None:
+        """
+        Removes known cards (i.e. hands and board cards dealt elsewhere) from
+        the deck, keeping the order of the rest.
+
+        Args:
+            dead (CardSet): The cards to remove
+
+        """
+        buffer = self._buffer
+        shuffled = [card for card in buffer[self._cursor : self._shuffled] if card not in dead]
+        rest = [card for card in buffer[self._shuffled :] if card not in dead]
+        self._buffer[self._cursor :] = shuffled + rest
+        self._shuffled = self._cursor + len(shuffled)
 
     def __str__(self) -> str:
         return card.card_list_to_pretty_str(self.cards)
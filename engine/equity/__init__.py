@@ -0,0 +1,5 @@
+"""The equity package. Includes the monte carlo, exact and range equity modules."""
+
+from engine.equity.monte_carlo import EquityResult, monte_carlo_equity
+from engine.equity.exact import exact_equity, all_in_ev
+from engine.equity.ranges import RangeEquity, range_equity, hand_range, combo_index
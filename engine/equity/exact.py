@@ -0,0 +1,221 @@
+"""
+Exact equities for hands that are all-in before the river, found by
+enumerating every runout of the remaining board.
+
+The rank keys and suit lanes (see :func:`engine.evaluator.evaluator.index_keys`)
+of every player's hole cards and the known board are computed once; each
+runout only adds the keys of its own cards before the table lookup. The
+runouts are split by their first card, so the work can be spread over a
+process pool.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import itertools
+
+import numpy as np
+
+from engine.card.card import Card
+from engine.card.card_index import to_indices
+from engine.evaluator.evaluator import evaluate_keys, index_keys
+from engine.evaluator.isomorphism import canonical_key, get_cache
+from engine.card.card_set import CardSet
+from engine.equity.monte_carlo import EquityResult
+
+
+def _enumerate_runouts(
+    base_keys: np.ndarray,
+    base_lanes: np.ndarray,
+    groups: Tuple[Tuple[int, ...], ...],
+    first: Optional[int],
+    rest: np.ndarray,
+    num_rest: int,
+) -> np.ndarray:
+    """
+    Scores every player on every runout that starts with the given card and
+    tallies the results within each group of players.
+
+    Arguments:
+        base_keys (np.ndarray): The rank key of every player's hole cards and board
+        base_lanes (np.ndarray): The suit lanes of every player's hole cards and board
+        groups (Tuple[Tuple[int, ...], ...]): The players competing against each other
+        first (Optional[int]): The deck index of the first runout card, None on the river
+        rest (np.ndarray): The deck indices the rest of the runout is chosen from
+        num_rest (int): How many more runout cards to choose
+    Returns:
+        np.ndarray: A (len(groups), 3, num_players + 1) array of the wins, ties and
+            pot share sums of every player in every group, with the number of
+            runouts in the last column
+    """
+    if num_rest:
+        combos = itertools.combinations(rest.tolist(), num_rest)
+        runouts = np.fromiter(
+            itertools.chain.from_iterable(combos), dtype=np.int64
+        ).reshape(-1, num_rest)
+    else:
+        runouts = np.empty((1, 0), dtype=np.int64)
+    if first is not None:
+        runouts = np.insert(runouts, 0, first, axis=1)
+
+    runout_keys, runout_lanes = index_keys(runouts)
+    ranks = np.stack(
+        [
+            evaluate_keys(key + runout_keys, lane + runout_lanes)
+            for key, lane in zip(base_keys.tolist(), base_lanes.tolist())
+        ]
+    )
+
+    totals = np.zeros((len(groups), 3, len(base_keys) + 1))
+    totals[:, :, -1] = len(runouts)
+    for i, group in enumerate(groups):
+        group = list(group)
+        is_best = ranks[group] == ranks[group].min(axis=0)
+        num_best = is_best.sum(axis=0)
+
+        totals[i, 0, group] = (is_best & (num_best == 1)).sum(axis=1)
+        totals[i, 1, group] = (is_best & (num_best > 1)).sum(axis=1)
+        totals[i, 2, group] = (is_best / num_best).sum(axis=1)
+    return totals
+
+
+def _enumerate_runouts_star(args) -> np.ndarray:
+    """:func:`_enumerate_runouts` with packed arguments, for the process pool."""
+    return _enumerate_runouts(*args)
+
+
+def _exact_totals(
+    hands: List[List[Card]],
+    board: List[Card],
+    groups: Tuple[Tuple[int, ...], ...],
+    processes: int,
+) -> np.ndarray:
+    """
+    Enumerates every runout of the board once and tallies the results within
+    each group of players. See :func:`_enumerate_runouts` for the layout.
+    """
+    if any(len(hand) != 2 for hand in hands):
+        raise ValueError("Every hand must have exactly two cards")
+    if len(board) not in (0, 3, 4, 5):
+        raise ValueError(f"Board must have 0, 3, 4 or 5 cards, got {len(board)}")
+
+    dead = CardSet.from_cards([card for hand in hands for card in hand] + board)
+    live = np.array(dead.complement().indices(), dtype=np.int64)
+    base_keys, base_lanes = index_keys(
+        np.array([to_indices(list(hand) + board) for hand in hands])
+    )
+
+    # split the runouts by their first card
+    num_runout = 5 - len(board)
+    if num_runout == 0:
+        tasks = [(base_keys, base_lanes, groups, None, live[:0], 0)]
+    else:
+        tasks = [
+            (base_keys, base_lanes, groups, first, live[i + 1 :], num_runout - 1)
+            for i, first in enumerate(live[: len(live) - num_runout + 1].tolist())
+        ]
+
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            return sum(pool.map(_enumerate_runouts_star, tasks))
+    return sum(map(_enumerate_runouts_star, tasks))
+
+
+def exact_equity(
+    hands: List[List[Card]],
+    board: Optional[List[Card]] = None,
+    processes: int = 1,
+) -> List[EquityResult]:
+    """
+    Enumerates every runout of the board and returns the exact win, tie and lose
+    probabilities and pot share of every hand. Meant for all-in spots: preflop
+    there are at most C(48, 5) runouts, on the turn only 44 to 46. Results are
+    cached by the suit isomorphism class of the hands and board.
+
+    Arguments:
+        hands (List[List[Card]]): The two card hands of every player
+        board (Optional[List[Card]]): The 0, 3, 4 or 5 known board cards
+        processes (int): How many processes to enumerate on, defaults to 1 (no pool)
+    Returns:
+        List[EquityResult]: The exact result of every hand in the order given
+    Raises:
+        ValueError: If the cards are not valid
+    """
+    if len(hands) < 2:
+        raise ValueError("Need at least two hands")
+
+    board = list(board or [])
+    cache = get_cache("exact_equity", maxsize=4096)
+    key = canonical_key(list(hands) + [board])
+    results = cache.get(key)
+    if results is None:
+        results = _exact_equity(hands, board, processes)
+        cache.put(key, results)
+    return list(results)
+
+
+def _exact_equity(
+    hands: List[List[Card]], board: List[Card], processes: int
+) -> List[EquityResult]:
+    """The uncached :func:`exact_equity`."""
+    totals = _exact_totals(hands, board, (tuple(range(len(hands))),), processes)[0]
+    count = int(totals[0, -1])
+
+    results = []
+    for wins, ties, share in zip(*totals[:, :-1].tolist()):
+        results.append(
+            EquityResult(
+                win=wins / count,
+                tie=ties / count,
+                lose=(count - wins - ties) / count,
+                equity=share / count,
+                samples=count,
+                ci_width=0.0,
+            )
+        )
+    return results
+
+
+def all_in_ev(
+    pots: List[Tuple[int, List[int]]],
+    hands: Dict[int, List[Card]],
+    board: List[Card],
+    processes: int = 1,
+) -> Dict[int, float]:
+    """
+    The expected chips every player wins from the given pots if the rest of the
+    board is dealt out. The runouts are enumerated once for all the pots.
+
+    Arguments:
+        pots (List[Tuple[int, List[int]]]): The amount and players in each pot
+        hands (Dict[int, List[Card]]): The hand of every player
+        board (List[Card]): The known board cards
+        processes (int): How many processes to enumerate on, defaults to 1 (no pool)
+    Returns:
+        Dict[int, float]: Map of player_id -> expected chips won
+    """
+    expected = {player_id: 0.0 for _, players in pots for player_id in players}
+
+    contested = [(amount, players) for amount, players in pots if len(players) > 1]
+    for amount, players in pots:
+        if len(players) == 1:
+            expected[players[0]] += amount
+    if not contested:
+        return expected
+
+    player_ids = sorted({player_id for _, players in contested for player_id in players})
+    index = {player_id: i for i, player_id in enumerate(player_ids)}
+    groups = tuple(
+        tuple(index[player_id] for player_id in players) for _, players in contested
+    )
+
+    totals = _exact_totals(
+        [hands[player_id] for player_id in player_ids], list(board), groups, processes
+    )
+    for (amount, _), group_totals in zip(contested, totals):
+        shares = (group_totals[2, :-1] / group_totals[2, -1]).tolist()
+        for player_id in player_ids:
+            expected[player_id] += amount * shares[index[player_id]]
+
+    return expected
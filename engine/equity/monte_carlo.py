@@ -0,0 +1,241 @@
+"""
+Estimates the equity of a hand by sampling the unknown cards:
+the rest of the board and the hands of any opponents that are not given.
+
+Cards are handled as indices into the full deck (see
+:mod:`engine.card.card_index`), the known cards form a 52-bit dead card mask
+and every batch of samples is drawn without replacement from the remaining
+cards with NumPy and scored with :func:`engine.evaluator.evaluator.evaluate_many`. Large sample counts
+are split over a process pool, and sampling stops early once the
+confidence interval of the equity is narrower than requested.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple
+import math
+
+import numpy as np
+
+from engine.card.card import Card
+from engine.card.card_index import CARDS, CARD_TO_INDEX
+from engine.card.card_set import CardSet
+from engine.evaluator.evaluator import evaluate_many
+
+# z-score of a two-sided 95% confidence interval
+_Z_95 = 1.96
+
+
+@dataclass(frozen=True)
+class EquityResult:
+    """The outcome of an equity calculation for the hero hand."""
+
+    win: float
+    """Probability that the hero has the best hand alone."""
+
+    tie: float
+    """Probability that the hero ties for the best hand."""
+
+    lose: float
+    """Probability that an opponent has a better hand."""
+
+    equity: float
+    """Expected share of the pot, ties are split evenly."""
+
+    samples: int
+    """How many runouts the estimate is based on."""
+
+    ci_width: float
+    """Width of the 95% confidence interval of the equity, 0 if exact."""
+
+
+def dead_mask(cards: Iterable[Card]) -> int:
+    """
+    Arguments:
+        cards (Iterable[Card]): The known cards
+    Returns:
+        int: A 52-bit mask with the deck index of every card set
+    Raises:
+        ValueError: If a card appears twice
+    """
+    return CardSet.from_cards(cards).mask
+
+
+def live_indices(mask: int) -> np.ndarray:
+    """
+    Arguments:
+        mask (int): A 52-bit dead card mask
+    Returns:
+        np.ndarray: The deck indices of the cards not in the mask
+    """
+    return np.array(CardSet(mask).complement().indices(), dtype=np.int64)
+
+
+def _sample_batch(
+    hand: Sequence[int],
+    board: Sequence[int],
+    opponent_hands: Sequence[Sequence[int]],
+    num_random_opponents: int,
+    live: np.ndarray,
+    batch_size: int,
+    seed: np.random.SeedSequence,
+) -> Tuple[int, int, int, float, float]:
+    """
+    Samples batch_size runouts and scores the hero hand against every opponent.
+    All cards are given as deck indices.
+
+    Returns:
+        Tuple[int, int, int, float, float]: The number of samples, wins, ties and
+            the sum and sum of squares of the hero's pot share
+    """
+    rng = np.random.default_rng(seed)
+    num_board = 5 - len(board)
+    num_drawn = num_board + 2 * num_random_opponents
+
+    # a random order of the live cards per sample, without replacement
+    order = np.argsort(rng.random((batch_size, len(live))), axis=1)
+    drawn = live[order[:, :num_drawn]]
+    known_board = np.broadcast_to(CARDS[list(board)], (batch_size, len(board)))
+    boards = np.concatenate((known_board, CARDS[drawn[:, :num_board]]), axis=1)
+
+    hands = [np.broadcast_to(CARDS[list(hand)], (batch_size, 2))]
+    hands += [
+        np.broadcast_to(CARDS[list(opp)], (batch_size, 2)) for opp in opponent_hands
+    ]
+    hands += [
+        CARDS[drawn[:, num_board + 2 * i : num_board + 2 * i + 2]]
+        for i in range(num_random_opponents)
+    ]
+
+    ranks = np.stack([evaluate_many(h, boards) for h in hands])
+    best = ranks.min(axis=0)
+    hero_best = ranks[0] == best
+    num_best = (ranks == best).sum(axis=0)
+
+    share = hero_best / num_best
+    return (
+        batch_size,
+        int((hero_best & (num_best == 1)).sum()),
+        int((hero_best & (num_best > 1)).sum()),
+        float(share.sum()),
+        float((share * share).sum()),
+    )
+
+
+def _sample_batch_star(args) -> Tuple[int, int, int, float, float]:
+    """:func:`_sample_batch` with packed arguments, for the process pool."""
+    return _sample_batch(*args)
+
+
+def monte_carlo_equity(
+    hand: List[Card],
+    board: Optional[List[Card]] = None,
+    num_opponents: int = 1,
+    opponent_hands: Optional[List[List[Card]]] = None,
+    samples: int = 100_000,
+    ci_width: Optional[float] = None,
+    batch_size: int = 10_000,
+    processes: int = 1,
+    seed: Optional[int] = None,
+) -> EquityResult:
+    # pylint: disable=too-many-arguments,too-many-locals
+    """
+    Estimates the win, tie and lose probabilities and the pot equity of the hero hand
+    by sampling the missing board cards and the hands of the opponents.
+
+    Arguments:
+        hand (List[Card]): The two cards of the hero
+        board (Optional[List[Card]]): The 0, 3, 4 or 5 known board cards
+        num_opponents (int): How many opponents the hero faces, defaults to 1
+        opponent_hands (Optional[List[List[Card]]]): Known opponent hands, any other
+            of the num_opponents hands are random
+        samples (int): The maximum number of runouts to sample
+        ci_width (Optional[float]): Stop early once the 95% confidence interval
+            of the equity is narrower than this
+        batch_size (int): How many runouts to sample with NumPy at once
+        processes (int): How many processes to sample on, defaults to 1 (no pool)
+        seed (Optional[int]): Seed for reproducible results
+    Returns:
+        EquityResult: The estimated probabilities
+    Raises:
+        ValueError: If the cards, the number of opponents or the sample and batch
+            sizes are not valid
+    """
+    if samples < 1 or batch_size < 1:
+        raise ValueError(
+            f"Need at least 1 sample and a batch size of at least 1, "
+            f"got samples={samples} and batch_size={batch_size}"
+        )
+
+    board = list(board or [])
+    opponent_hands = [list(opp) for opp in opponent_hands or []]
+    num_opponents = max(num_opponents, len(opponent_hands))
+
+    if len(hand) != 2 or any(len(opp) != 2 for opp in opponent_hands):
+        raise ValueError("Every hand must have exactly two cards")
+    if len(board) not in (0, 3, 4, 5):
+        raise ValueError(f"Board must have 0, 3, 4 or 5 cards, got {len(board)}")
+    if num_opponents < 1:
+        raise ValueError("Need at least one opponent")
+
+    known = list(hand) + board + [card for opp in opponent_hands for card in opp]
+    live = live_indices(dead_mask(known))
+    num_random_opponents = num_opponents - len(opponent_hands)
+    if len(live) < 5 - len(board) + 2 * num_random_opponents:
+        raise ValueError(f"Not enough cards left for {num_opponents} opponents")
+
+    args = (
+        [CARD_TO_INDEX[int(card)] for card in hand],
+        [CARD_TO_INDEX[int(card)] for card in board],
+        [[CARD_TO_INDEX[int(card)] for card in opp] for opp in opponent_hands],
+        num_random_opponents,
+        live,
+    )
+
+    seeds = np.random.SeedSequence(seed).spawn(math.ceil(samples / batch_size))
+    batches = [
+        args + (min(batch_size, samples - i * batch_size), batch_seed)
+        for i, batch_seed in enumerate(seeds)
+    ]
+
+    totals = np.zeros(5)
+    pool = ProcessPoolExecutor(processes) if processes > 1 else None
+    try:
+        # one batch per process at a time, so we can stop in between
+        for start in range(0, len(batches), max(processes, 1)):
+            round_batches = batches[start : start + max(processes, 1)]
+            if pool is None:
+                results = map(_sample_batch_star, round_batches)
+            else:
+                results = pool.map(_sample_batch_star, round_batches)
+            for result in results:
+                totals += result
+
+            if ci_width is not None and _ci_width(totals) <= ci_width:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    count, wins, ties, share_sum, _ = totals.tolist()
+    return EquityResult(
+        win=wins / count,
+        tie=ties / count,
+        lose=(count - wins - ties) / count,
+        equity=share_sum / count,
+        samples=int(count),
+        ci_width=_ci_width(totals),
+    )
+
+
+def _ci_width(totals: np.ndarray) -> float:
+    """
+    Returns:
+        float: The width of the 95% confidence interval of the mean pot share
+    """
+    count, _, _, share_sum, share_sq_sum = totals
+    mean = share_sum / count
+    variance = max(share_sq_sum / count - mean * mean, 0.0)
+    return 2 * _Z_95 * math.sqrt(variance / count)
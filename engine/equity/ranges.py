@@ -0,0 +1,340 @@
+"""
+Equity of a weighted hand range against one or more opposing ranges.
+
+A range is a length-1326 vector of weights, one for every two card combo in
+the order of :data:`ComboTables.combos`. Card removal is handled with precomputed blocker
+masks: every combo's 52-bit card mask and, for every combo, the 100 other
+combos sharing a card with it.
+
+On a complete board all 1326 combos are evaluated once and sorted by rank,
+so the weight an opposing range puts on worse and on tied hands comes from a
+cumulative sum instead of comparing every pair of combos. The combos blocked
+by the hero's own cards are then subtracted. Earlier streets enumerate every
+runout of the flop or turn (preflop the boards are sampled) and add up the
+river results.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from math import comb
+from typing import Dict, List, Optional, Sequence, Tuple
+import itertools
+
+import numpy as np
+
+from engine.card.card import Card
+from engine.card.card_index import CARD_TO_INDEX
+from engine.card.card_set import CardSet, masks_from_indices
+from engine.evaluator.evaluator import evaluate_keys, index_keys
+
+NUM_COMBOS = 1326
+
+
+@dataclass(frozen=True)
+class ComboTables:
+    """The combo tables shared by the range functions, built on first use."""
+
+    combos: np.ndarray
+    """The (1326, 2) deck indices of every combo, the order of a range vector."""
+
+    masks: np.ndarray
+    """The 52-bit card set mask of every combo."""
+
+    blockers: np.ndarray
+    """The (1326, 100) other combos sharing a card with every combo."""
+
+    keys: np.ndarray
+    """The evaluator key of every combo, see :func:`index_keys`."""
+
+    lanes: np.ndarray
+    """The evaluator lane of every combo."""
+
+    index: Dict[Tuple[int, int], int]
+    """(first, second) deck indices => combo index."""
+
+
+def build_combo_tables() -> ComboTables:
+    """
+    Returns:
+        ComboTables: The combo tables of every two card combo
+    """
+    combos = np.array(list(itertools.combinations(range(52), 2)), dtype=np.int64)
+    masks = masks_from_indices(combos)
+    blocked = (masks[:, None] & masks[None, :]) != 0
+    np.fill_diagonal(blocked, False)
+    keys, lanes = index_keys(combos)
+    return ComboTables(
+        combos=combos,
+        masks=masks,
+        blockers=np.nonzero(blocked)[1].reshape(NUM_COMBOS, -1),
+        keys=keys,
+        lanes=lanes,
+        index={(first, second): i for i, (first, second) in enumerate(combos.tolist())},
+    )
+
+
+_COMBO_TABLES: Optional[ComboTables] = None
+
+
+def get_combo_tables() -> ComboTables:
+    """
+    Returns:
+        ComboTables: The shared combo tables, built by :func:`build_combo_tables`
+            on the first call.
+    """
+    global _COMBO_TABLES  # pylint: disable=global-statement
+    if _COMBO_TABLES is None:
+        _COMBO_TABLES = build_combo_tables()
+    return _COMBO_TABLES
+
+
+def __getattr__(name: str):
+    # COMBOS, COMBO_MASKS and BLOCKERS are kept as module attributes, built
+    # when first accessed
+    if name == "COMBOS":
+        return get_combo_tables().combos
+    if name == "COMBO_MASKS":
+        return get_combo_tables().masks
+    if name == "BLOCKERS":
+        return get_combo_tables().blockers
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@dataclass(frozen=True)
+class RangeEquity:
+    """The equity of a range against the opposing ranges."""
+
+    per_combo: np.ndarray
+    """(1326,) equity of every combo, NaN for combos outside the range or
+    that can't be dealt."""
+
+    equity: float
+    """The equity of the whole range, every combo weighted by its weight and
+    how much of the opposing ranges it leaves."""
+
+
+def combo_index(cards: List[Card]) -> int:
+    """
+    Arguments:
+        cards (List[Card]): Two hole cards
+    Returns:
+        int: The index of the combo in a range vector
+    """
+    first, second = sorted((CARD_TO_INDEX[cards[0]], CARD_TO_INDEX[cards[1]]))
+    return get_combo_tables().index[first, second]
+
+
+def hand_range(
+    hands: Sequence[List[Card]], weights: Optional[Sequence[float]] = None
+) -> np.ndarray:
+    """
+    Arguments:
+        hands (Sequence[List[Card]]): The combos in the range
+        weights (Optional[Sequence[float]]): The weight of every combo, defaults to 1
+    Returns:
+        np.ndarray: The (1326,) range vector
+    """
+    weights = [1.0] * len(hands) if weights is None else weights
+    range_vector = np.zeros(NUM_COMBOS)
+    for hand, weight in zip(hands, weights):
+        range_vector[combo_index(hand)] = weight
+    return range_vector
+
+
+def _river_totals(
+    ranks: np.ndarray, live: np.ndarray, weights: np.ndarray, combos: np.ndarray
+) -> tuple:
+    """
+    The weight of an opposing range on worse, tied and all hands that can be
+    dealt next to each of the given combos, on one complete board.
+
+    Arguments:
+        ranks (np.ndarray): (1326,) rank of every combo on the board
+        live (np.ndarray): (1326,) combos not blocked by the board
+        weights (np.ndarray): (1326,) the opposing range
+        combos (np.ndarray): (K,) the hero's combos
+    Returns:
+        tuple: The (K,) worse, tied and total weights
+    """
+    weights = np.where(live, weights, 0.0)
+    order = np.argsort(ranks, kind="stable")
+    sorted_ranks = ranks[order]
+    cumulative = np.r_[0.0, np.cumsum(weights[order])]
+
+    hero_ranks = ranks[combos]
+    better_or_tied = cumulative[np.searchsorted(sorted_ranks, hero_ranks, side="right")]
+    better = cumulative[np.searchsorted(sorted_ranks, hero_ranks, side="left")]
+    total = cumulative[-1]
+
+    # take out the combo itself and the combos sharing a card with it
+    blockers = get_combo_tables().blockers[combos]
+    blocker_weights = weights[blockers]
+    blocker_ranks = ranks[blockers]
+    own = weights[combos]
+    worse = (
+        total
+        - better_or_tied
+        - (blocker_weights * (blocker_ranks > hero_ranks[:, None])).sum(axis=1)
+    )
+    tied = (
+        better_or_tied
+        - better
+        - own
+        - (blocker_weights * (blocker_ranks == hero_ranks[:, None])).sum(axis=1)
+    )
+    return worse, tied, total - own - blocker_weights.sum(axis=1)
+
+
+def river_strengths(board: Sequence[int]) -> np.ndarray:
+    """
+    The hand strength of every combo on a complete board: the chance of
+    beating one random hand that can be dealt next to it, ties counting half.
+
+    With every opposing combo weighted the same, the hands blocked by each
+    hero card are counted with a single sort of the combos by card and rank
+    instead of going through :data:`ComboTables.blockers`.
+
+    Arguments:
+        board (Sequence[int]): The 5 board cards as deck indices
+    Returns:
+        np.ndarray: (1326,) hand strength of every combo, NaN for the combos
+            sharing a card with the board
+    """
+    tables = get_combo_tables()
+    key, lane = index_keys([list(board)])
+    live = (tables.masks & masks_from_indices(board)) == 0
+    ranks = np.zeros(NUM_COMBOS, dtype=np.int64)
+    ranks[live] = evaluate_keys(tables.keys[live] + key, tables.lanes[live] + lane)
+
+    combos = np.flatnonzero(live)
+    hero_ranks = ranks[combos]
+    live_ranks = np.sort(ranks[combos])
+    worse = len(combos) - np.searchsorted(live_ranks, hero_ranks, side="right")
+    tied = np.searchsorted(live_ranks, hero_ranks, side="right") - np.searchsorted(
+        live_ranks, hero_ranks, side="left"
+    )
+
+    # every combo under both of its cards, card * 8192 + rank, the 51 combos
+    # of a card in a row (board combos have rank 0, below every hand)
+    first, second = tables.combos[:, 0], tables.combos[:, 1]
+    by_card = np.sort(np.r_[first * 8192 + ranks, second * 8192 + ranks])
+    for card in (first[combos], second[combos]):
+        right = np.searchsorted(by_card, card * 8192 + hero_ranks, side="right")
+        left = np.searchsorted(by_card, card * 8192 + hero_ranks, side="left")
+        worse -= (card + 1) * 51 - right
+        tied -= right - left
+    # the hero combo itself was counted as tied three times
+    tied += 1
+
+    strengths = np.full(NUM_COMBOS, np.nan)
+    strengths[combos] = (worse + tied / 2) / comb(45, 2)
+    return strengths
+
+
+def _share(worse: List[np.ndarray], tied: List[np.ndarray], totals: List[np.ndarray]):
+    """
+    The expected pot share of every combo against the opposing ranges, taking
+    the opponents' hands as independent of each other.
+
+    Returns:
+        np.ndarray: (K,) expected share, 0 where an opposing range is empty
+    """
+    num_combos = len(worse[0])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # coefficients of prod_i (p_worse_i + p_tied_i * x): the chance of
+        # tying with k opponents and beating the rest
+        poly = np.ones((1, num_combos))
+        for worse_i, tied_i, total_i in zip(worse, tied, totals):
+            p_worse = np.where(total_i > 0, worse_i / total_i, 0.0)
+            p_tied = np.where(total_i > 0, tied_i / total_i, 0.0)
+            poly = np.r_[poly * p_worse, np.zeros((1, num_combos))] + np.r_[
+                np.zeros((1, num_combos)), poly * p_tied
+            ]
+    return (poly / np.arange(1, len(poly) + 1)[:, None]).sum(axis=0)
+
+
+def range_equity(
+    hero_range: np.ndarray,
+    opposing_ranges: Sequence[np.ndarray],
+    board: Optional[List[Card]] = None,
+    samples: int = 5_000,
+    seed: Optional[int] = None,
+) -> RangeEquity:
+    """
+    Computes the equity of every combo in a range, and of the whole range,
+    against one or more opposing ranges. Card removal between the hero and the
+    opponents and between the board and everyone is exact. With several opposing
+    ranges the opponents' hands are taken as independent of each other.
+
+    Arguments:
+        hero_range (np.ndarray): (1326,) weights of the hero's combos
+        opposing_ranges (Sequence[np.ndarray]): (1326,) weights of every opponent's combos
+        board (Optional[List[Card]]): The 0, 3, 4 or 5 known board cards
+        samples (int): How many boards to sample preflop, defaults to 5000
+        seed (Optional[int]): The random seed for sampling preflop boards
+    Returns:
+        RangeEquity: The per combo and aggregate equity of the hero's range
+    Raises:
+        ValueError: If the ranges or board are not valid
+    """
+    board = list(board or [])
+    hero_range = np.asarray(hero_range, dtype=np.float64)
+    opposing_ranges = [np.asarray(weights, dtype=np.float64) for weights in opposing_ranges]
+    if not opposing_ranges:
+        raise ValueError("Need at least one opposing range")
+    if any(weights.shape != (NUM_COMBOS,) for weights in [hero_range] + opposing_ranges):
+        raise ValueError(f"Ranges must have shape ({NUM_COMBOS},)")
+    if len(board) not in (0, 3, 4, 5):
+        raise ValueError(f"Board must have 0, 3, 4 or 5 cards, got {len(board)}")
+
+    # every runout of the board as deck indices
+    dead = CardSet.from_cards(board)
+    board_indices = dead.indices()
+    if len(board) == 0:
+        rng = np.random.default_rng(seed)
+        runouts = np.argsort(rng.random((samples, 52)), axis=1)[:, :5]
+    else:
+        runouts = np.array(
+            [
+                board_indices + list(rest)
+                for rest in itertools.combinations(
+                    dead.complement().indices(), 5 - len(board)
+                )
+            ],
+            dtype=np.int64,
+        )
+
+    tables = get_combo_tables()
+    hero_combos = np.flatnonzero(hero_range > 0)
+    board_keys, board_lanes = index_keys(runouts)
+    share_sum = np.zeros(len(hero_combos))
+    weight_sum = np.zeros(len(hero_combos))
+    for runout, key, lane in zip(runouts, board_keys, board_lanes):
+        live = (tables.masks & masks_from_indices(runout)) == 0
+        # combos sharing a card with the board can't be evaluated
+        ranks = np.zeros(NUM_COMBOS, dtype=np.int32)
+        ranks[live] = evaluate_keys(tables.keys[live] + key, tables.lanes[live] + lane)
+
+        worse, tied, totals = zip(
+            *(
+                _river_totals(ranks, live, weights, hero_combos)
+                for weights in opposing_ranges
+            )
+        )
+        weight = np.where(live[hero_combos], np.prod(totals, axis=0), 0.0)
+        share_sum += weight * _share(worse, tied, totals)
+        weight_sum += weight
+
+    per_combo = np.full(NUM_COMBOS, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_combo[hero_combos] = np.where(weight_sum > 0, share_sum / weight_sum, np.nan)
+
+    hero_weights = hero_range[hero_combos]
+    hero_total = (hero_weights * weight_sum).sum()
+    equity = (
+        float((hero_weights * share_sum).sum() / hero_total)
+        if hero_total > 0
+        else float("nan")
+    )
+    return RangeEquity(per_combo=per_combo, equity=equity)
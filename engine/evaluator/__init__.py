@@ -2,6 +2,14 @@
 
 from engine.evaluator.evaluator import (
     evaluate,
+    evaluate_many,
     rank_to_string,
     get_five_card_rank_percentage,
+    get_rank_class,
+    get_rank_class_many,
+    rank_to_string_many,
+    get_five_card_rank_percentage_many,
 )
+from engine.evaluator.preflop import PreflopEquity, get_preflop_equity, hand_class
+from engine.evaluator.isomorphism import canonical_key, cache_stats, get_cache
+from engine.evaluator.hand_strength import HandStrength, hand_strength
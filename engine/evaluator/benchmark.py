@@ -0,0 +1,305 @@
+"""
+The benchmark module measures the speed of the evaluator and checks its
+ranks against the reference implementation in ``treys``, which uses the same
+card ints and rank scale. Run it with::
+
+    python -m engine.evaluator.benchmark --processes 8 --output bench.json
+
+It reports, as JSON:
+    rates         => 5, 6 and 7 card evaluations per second of :func:`evaluate`
+                     and :func:`evaluate_many`
+    lookup_table  => seconds to build the :class:`LookupTable`, to memory map
+                     it from its file and to import the evaluator package in a
+                     fresh interpreter
+    verification  => for every hand size, how many hands were compared and how
+                     many (and which) disagreed with ``treys``, on both APIs
+Every 5 card hand is compared. The 6 and 7 card spaces are sampled unless
+``--full-seven`` asks for all C(52, 7) seven card hands, which takes hours.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from treys import Evaluator as TreysEvaluator
+
+from engine.card.card import Card
+from engine.card.card_index import indices_to_cards
+from engine.evaluator.evaluator import evaluate, evaluate_many
+from engine.evaluator.lookup_table import LookupTable
+
+# the number of mismatching hands to keep as examples in the report
+_MAX_EXAMPLES = 10
+
+
+def _random_hands(num_hands: int, num_cards: int, seed: Optional[int]) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: (num_hands, num_cards) card ints, no card twice in a row
+    """
+    rng = np.random.default_rng(seed)
+    return indices_to_cards(np.argsort(rng.random((num_hands, 52)), axis=1)[:, :num_cards])
+
+
+def _per_second(function: Callable[[], object], count: int, min_time: float) -> float:
+    """
+    Returns:
+        float: How many of the count operations in one call of the function
+            run per second, calling it for at least min_time seconds
+    """
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls * count / elapsed
+
+
+def benchmark_rates(
+    samples: int = 100_000, min_time: float = 1.0, seed: Optional[int] = 0
+) -> Dict[str, Dict[str, float]]:
+    """
+    Arguments:
+        samples (int): How many random hands to evaluate per measurement
+        min_time (float): The least number of seconds per measurement
+        seed (Optional[int]): The random seed for the hands
+    Returns:
+        Dict[str, Dict[str, float]]: Map of "single" and "batched" -> number
+            of cards -> evaluations per second
+    """
+    rates: Dict[str, Dict[str, float]] = {"single": {}, "batched": {}}
+    for num_cards in (5, 6, 7):
+        hands = _random_hands(samples, num_cards, seed)
+        rows = [(row[:2], row[2:]) for row in hands.tolist()]
+
+        def single(rows=rows):
+            for hole_cards, board in rows:
+                evaluate(hole_cards, board)
+
+        def batched(hands=hands):
+            evaluate_many(hands[:, :2], hands[:, 2:])
+
+        rates["single"][str(num_cards)] = _per_second(single, len(rows), min_time)
+        rates["batched"][str(num_cards)] = _per_second(batched, len(hands), min_time)
+    return rates
+
+
+def benchmark_lookup_table() -> Dict[str, float]:
+    """
+    Returns:
+        Dict[str, float]: Seconds taken to build the lookup table, to load it
+            from a file and to import the evaluator package in a new process
+    """
+    start = time.perf_counter()
+    table = LookupTable()
+    build = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "lookup_table.bin")
+        table.save(path)
+        start = time.perf_counter()
+        LookupTable.from_file(path)
+        load = time.perf_counter() - start
+
+    code = (
+        "import time; start = time.perf_counter(); import engine.evaluator; "
+        "from engine.evaluator.lookup_table import get_lookup_table; get_lookup_table(); "
+        "print(time.perf_counter() - start)"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True
+    )
+    return {"build": build, "load": load, "import": float(output.stdout.strip())}
+
+
+def _compare(hands: np.ndarray) -> Dict[str, object]:
+    """
+    Arguments:
+        hands (np.ndarray): (N, k) card ints, the first two of each row the hole cards
+    Returns:
+        Dict[str, object]: The number of hands, the number of mismatches of
+            :func:`evaluate` and :func:`evaluate_many` and a few examples
+    """
+    reference = TreysEvaluator()
+    batched = evaluate_many(hands[:, :2], hands[:, 2:]).tolist()
+
+    single_mismatches = batched_mismatches = 0
+    examples: List[Dict[str, object]] = []
+    for row, batched_rank in zip(hands.tolist(), batched):
+        expected = reference.evaluate(row[:2], row[2:])
+        rank = evaluate(row[:2], row[2:])
+        single_mismatches += rank != expected
+        batched_mismatches += batched_rank != expected
+        if (rank != expected or batched_rank != expected) and len(examples) < _MAX_EXAMPLES:
+            examples.append(
+                {
+                    "cards": [str(Card.from_int(card)) for card in row],
+                    "treys": expected,
+                    "single": rank,
+                    "batched": batched_rank,
+                }
+            )
+    return {
+        "hands": len(hands),
+        "single_mismatches": single_mismatches,
+        "batched_mismatches": batched_mismatches,
+        "examples": examples,
+    }
+
+
+def _compare_indices(indices: np.ndarray) -> Dict[str, object]:
+    """:func:`_compare` for hands given as card indices."""
+    return _compare(indices_to_cards(indices))
+
+
+def _compare_seven_after(first: int, second: int) -> Dict[str, object]:
+    """:func:`_compare` for every 7 card hand whose two lowest card indices are given."""
+    rest = np.array(
+        list(itertools.combinations(range(second + 1, 52), 5)), dtype=np.int64
+    ).reshape(-1, 5)
+    indices = np.column_stack((np.full((len(rest), 2), (first, second)), rest))
+    return _compare_indices(indices)
+
+
+def _compare_sample(num_cards: int, samples: int, seed: Optional[int]) -> Dict[str, object]:
+    return _compare(_random_hands(samples, num_cards, seed))
+
+
+def _merge(results: List[Dict[str, object]]) -> Dict[str, object]:
+    return {
+        "hands": sum(result["hands"] for result in results),
+        "single_mismatches": sum(result["single_mismatches"] for result in results),
+        "batched_mismatches": sum(result["batched_mismatches"] for result in results),
+        "examples": list(
+            itertools.chain.from_iterable(result["examples"] for result in results)
+        )[:_MAX_EXAMPLES],
+    }
+
+
+def _star(args):
+    """Calls the first argument with the rest, for the process pool."""
+    return args[0](*args[1:])
+
+
+def _run(tasks: List[tuple], processes: int) -> Dict[str, object]:
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            return _merge(list(pool.map(_star, tasks)))
+    return _merge(list(map(_star, tasks)))
+
+
+def verify(
+    samples: int = 1_000_000,
+    full_seven: bool = False,
+    processes: int = 1,
+    chunk_size: int = 100_000,
+    seed: Optional[int] = 0,
+) -> Dict[str, Dict[str, object]]:
+    """
+    Compares the ranks of :func:`evaluate` and :func:`evaluate_many` with
+    ``treys``: every 5 card hand, and sampled (or all) 6 and 7 card hands.
+
+    Arguments:
+        samples (int): How many 6 and 7 card hands to sample
+        full_seven (bool): If every 7 card hand is compared instead of a sample
+        processes (int): How many processes to compare on, defaults to 1 (no pool)
+        chunk_size (int): How many hands each task compares
+        seed (Optional[int]): The random seed for the samples, defaults to 0
+    Returns:
+        Dict[str, Dict[str, object]]: Map of number of cards -> hands compared,
+            mismatches of each API and examples
+    """
+    fives = np.fromiter(
+        itertools.chain.from_iterable(itertools.combinations(range(52), 5)),
+        dtype=np.int8,
+    ).reshape(-1, 5)
+    report = {
+        "5": _run(
+            [
+                (_compare_indices, fives[i : i + chunk_size])
+                for i in range(0, len(fives), chunk_size)
+            ],
+            processes,
+        )
+    }
+
+    for num_cards in (6, 7):
+        if num_cards == 7 and full_seven:
+            tasks = [
+                (_compare_seven_after, first, second)
+                for first, second in itertools.combinations(range(47), 2)
+            ]
+        else:
+            tasks = [
+                (
+                    _compare_sample,
+                    num_cards,
+                    min(chunk_size, samples - i),
+                    None if seed is None else seed + i,
+                )
+                for i in range(0, samples, chunk_size)
+            ]
+        report[str(num_cards)] = _run(tasks, processes)
+        report[str(num_cards)]["exhaustive"] = num_cards == 7 and full_seven
+    report["5"]["exhaustive"] = True
+    return report
+
+
+def main():
+    """Runs the benchmarks and the verification and prints the JSON report."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--output", help="Write the report to this file instead of stdout")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--samples", type=int, default=1_000_000)
+    parser.add_argument("--full-seven", action="store_true")
+    parser.add_argument("--min-time", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-verify", action="store_true")
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "rates": benchmark_rates(min_time=args.min_time, seed=args.seed),
+        "lookup_table": benchmark_lookup_table(),
+    }
+    if not args.skip_verify:
+        start = time.perf_counter()
+        report["verification"] = verify(
+            args.samples, args.full_seven, args.processes, seed=args.seed
+        )
+        report["verification_seconds"] = time.perf_counter() - start
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+    # a non-zero exit code, so a regression fails the run
+    if any(
+        result["single_mismatches"] or result["batched_mismatches"]
+        for result in report.get("verification", {}).values()
+    ):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
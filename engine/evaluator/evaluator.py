@@ -6,26 +6,155 @@ I make considerable optimizations in terms of speed and memory usage,
 in fact the lookup table generation can be done in under a second and
 consequent evaluations are very fast. Won't beat C, but very fast as
 all calculations are done with bit arithmetic and table lookups.
+
+The batched functions (the ``*_many`` and ``*_keys`` ones) work on NumPy
+arrays. NumPy is only imported when they are first called, the single hand
+functions don't need it.
 """
 
-from typing import List
+from __future__ import annotations
 
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 import itertools
-from engine.card import card
+
 from engine.card.card import Card
-from engine.evaluator.lookup_table import LOOKUP_TABLE
-from engine.evaluator.two_lookup_table import two_suited, two_unsuited
+from engine.card.card_index import INDEX_TO_BITRANK, INDEX_TO_CARD, INDEX_TO_RANK
+from engine.evaluator.lookup_table import LookupTable, get_lookup_table
+from engine.evaluator.preflop import NUM_CLASSES, get_preflop_equity, hand_class
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# card index => rank key of the card
+_INDEX_TO_RANK_KEY = tuple(LookupTable.RANK_KEYS[rank] for rank in INDEX_TO_RANK)
+
+
+def _rank_classes() -> tuple:
+    """
+    Returns:
+        tuple: The rank class of every hand rank (0-7462), each class repeated
+            over the ranks up to its maximum
+    """
+    rank_classes: List[int] = []
+    for max_rank, rank_class in sorted(LookupTable.MAX_TO_RANK_CLASS.items()):
+        rank_classes += [rank_class] * (max_rank + 1 - len(rank_classes))
+    return tuple(rank_classes)
+
+
+# hand rank (0-7462) => rank class, without searching the class maxima
+_RANK_TO_CLASS = _rank_classes()
+
+_ARRAYS: Optional[Dict[str, np.ndarray]] = None
+
+
+def _get_arrays() -> Dict[str, np.ndarray]:
+    """
+    Returns:
+        Dict[str, np.ndarray]: The tables of the batched functions as NumPy
+            arrays by name, built on the first call
+    """
+    global _ARRAYS  # pylint: disable=global-statement
+    if _ARRAYS is None:
+        # pylint: disable=import-outside-toplevel
+        import numpy as np
+
+        rank_to_class = np.array(_RANK_TO_CLASS, dtype=np.uint8)
+        rank_to_class.flags.writeable = False
+        _ARRAYS = {
+            # suit int (1, 2, 4, 8) => the shift of that suit's 13 bit lane
+            "_SUIT_LANE": np.array([0, 0, 13, 0, 26, 0, 0, 0, 39], dtype=np.int64),
+            # card index => 13 bit lane of the card's suit, see card_keys
+            "_INDEX_TO_LANE": np.array(
+                [
+                    bitrank << (13 * (index & 3))
+                    for index, bitrank in enumerate(INDEX_TO_BITRANK)
+                ],
+                dtype=np.int64,
+            ),
+            # the rank class of every hand rank
+            "RANK_TO_CLASS": rank_to_class,
+            # rank class => its name, index 0 unused
+            "_CLASS_STRINGS": np.array(
+                [""]
+                + [
+                    LookupTable.RANK_CLASS_TO_STRING[rank_class]
+                    for rank_class in range(1, 10)
+                ]
+            ),
+        }
+    return _ARRAYS
+
+
+def __getattr__(name: str):
+    # RANK_TO_CLASS is kept as a read-only NumPy module attribute, built when
+    # first accessed
+    if name == "RANK_TO_CLASS":
+        return _get_arrays()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_TWO_TABLES: Optional[Tuple[list, list]] = None
+
+
+def _get_two_tables() -> Tuple[list, list]:
+    """
+    Returns:
+        Tuple[list, list]: The suited and unsuited two card tables, imported
+            on the first call.
+    """
+    global _TWO_TABLES  # pylint: disable=global-statement
+    if _TWO_TABLES is None:
+        # pylint: disable=import-outside-toplevel
+        from engine.evaluator.two_lookup_table import two_suited, two_unsuited
+
+        _TWO_TABLES = two_suited, two_unsuited
+    return _TWO_TABLES
+
+
+_PREFLOP_PERCENTILES: Optional[np.ndarray] = None
+
+
+def _get_preflop_percentiles() -> Optional[np.ndarray]:
+    """
+    Returns:
+        Optional[np.ndarray]: For each starting hand class, the fraction of the
+            1326 starting hands with less equity against a random hand (ties count
+            half), or None if the preflop equity tables have not been generated.
+    """
+    global _PREFLOP_PERCENTILES  # pylint: disable=global-statement
+    preflop_equity = get_preflop_equity()
+    if _PREFLOP_PERCENTILES is None and preflop_equity is not None:
+        # pylint: disable=import-outside-toplevel
+        import numpy as np
+
+        equity = preflop_equity.versus_random[:, 0]
+        # 6 combos of a pair, 4 suited, 12 offsuit
+        row, col = np.divmod(np.arange(NUM_CLASSES), 13)
+        combos = np.where(row == col, 6, np.where(row > col, 4, 12))
+        weaker = (equity[None, :] < equity[:, None]) + 0.5 * (
+            equity[None, :] == equity[:, None]
+        )
+        _PREFLOP_PERCENTILES = (weaker * combos).sum(axis=1) / combos.sum()
+    return _PREFLOP_PERCENTILES
 
 
 def _two(cards: List[Card]) -> int:
     """
-    Using lookup table, return percentile of your hand with two cards
+    Return the percentile of your hand with two cards, by its equity against
+    a random hand (see :mod:`preflop`) or, if the preflop tables have not been
+    generated, the old percentile lookup table.
     """
     if len(cards) != 2:
         raise ValueError("Only 2-card hands are supported by the Two evaluator")
-    
-    r0, r1 = cards[0].rank , cards[1].rank
-    if cards[0].suit == cards[1].suit:
+
+    percentiles = _get_preflop_percentiles()
+    if percentiles is not None:
+        return float(percentiles[hand_class(cards)])
+
+    two_suited, two_unsuited = _get_two_tables()
+    r0, r1 = (cards[0] >> 8) & 0xF, (cards[1] >> 8) & 0xF
+    if (cards[0] ^ cards[1]) & 0xF000 == 0:
         if r0 < r1:
             return two_suited[r0][r1]
         else:
@@ -34,25 +163,41 @@ def _two(cards: List[Card]) -> int:
         return two_unsuited[r0][r1]
 
 
-def _five(cards: List[Card]) -> int:
+def _seven(cards: List[Card]) -> int:
     """
-    Performs an evaluation given card in integer form, mapping them to
-    a rank in the range [1, 7462], with lower ranks being more powerful.
-    Variant of Cactus Kev's 5 card evaluator.
+    Evaluates 5, 6 or 7 cards in a single pass, mapping them to the rank
+    of the best 5 card hand in the range [1, 7462]. The suited cards are
+    OR'd together per suit, a suit with 5 or more cards is looked up by
+    its rankbits, otherwise the rank counts of all cards are looked up
+    (see :mod:`lookup_table`).
     Args:
-        cards (list[Card]): A list of 5 card ints.
+        cards (list[Card]): A list of 5, 6 or 7 card ints.
     Returns:
-        int: The rank of the hand.
+        int: The rank of the best hand.
     """
-    # if flush
-    if cards[0] & cards[1] & cards[2] & cards[3] & cards[4] & 0xF000:
-        hand_or = (cards[0] | cards[1] | cards[2] | cards[3] | cards[4]) >> 16
-        prime = card.prime_product_from_rankbits(hand_or)
-        return LOOKUP_TABLE.flush_lookup[prime]
+    rank_keys = LookupTable.RANK_KEYS
+    key = 0
+    spades = hearts = diamonds = clubs = 0
+    for card_int in cards:
+        key += rank_keys[(card_int >> 8) & 0xF]
+        if card_int & 0x1000:
+            spades |= card_int
+        elif card_int & 0x2000:
+            hearts |= card_int
+        elif card_int & 0x4000:
+            diamonds |= card_int
+        else:
+            clubs |= card_int
+
+    # at most one suit can hold 5 or more cards
+    table = get_lookup_table()
+    flush_lookup = table.flush_lookup
+    for suited in (spades, hearts, diamonds, clubs):
+        rank = flush_lookup[suited >> 16]
+        if rank:
+            return rank
 
-    # otherwise
-    prime = card.prime_product_from_hand(cards)
-    return LOOKUP_TABLE.unsuited_lookup[prime]
+    return table.unsuited_lookup[table.unsuited_index(key)]
 
 
 def evaluate(cards: List[Card], board: List[Card]) -> int:
@@ -68,9 +213,168 @@ def evaluate(cards: List[Card], board: List[Card]) -> int:
     """
     if not board:
         return 7462 - round(_two(cards) * 7462)
-    
-    all_cards = cards + board
-    return min([_five(hand) for hand in itertools.combinations(all_cards, 5)])
+
+    return _seven(cards + board)
+
+
+def evaluate_indices(cards: List[int], board: List[int]) -> int:
+    """
+    :meth:`evaluate` for cards given as indices from 0 to 51
+    (see :mod:`engine.card.card_index`).
+    Args:
+        cards (list[int]): The indices of the two cards a player holds.
+        board (list[int]): The indices of the 0, 3, 4, or 5 board cards.
+    Returns:
+        int: A number between 1 (highest) and 7462 (lowest) representing the relative
+            hand rank of the given card.
+    """
+    if not board:
+        return evaluate([INDEX_TO_CARD[index] for index in cards], [])
+
+    key = 0
+    suited = [0, 0, 0, 0]
+    for index in itertools.chain(cards, board):
+        key += _INDEX_TO_RANK_KEY[index]
+        suited[index & 3] |= INDEX_TO_BITRANK[index]
+
+    # at most one suit can hold 5 or more cards
+    table = get_lookup_table()
+    flush_lookup = table.flush_lookup
+    for rankbits in suited:
+        rank = flush_lookup[rankbits]
+        if rank:
+            return rank
+
+    return table.unsuited_lookup[table.unsuited_index(key)]
+
+
+def evaluate_many(hands: np.ndarray, boards: np.ndarray) -> np.ndarray:
+    """
+    Evaluates many hands at once, without a Python loop over the hands.
+    Gives the same ranks as :meth:`evaluate` for each row.
+
+    Args:
+        hands (np.ndarray): An (N, 2) array of card ints that the players hold.
+        boards (np.ndarray): An (N, k) array of card ints with k equal to 0, 3, 4, or 5.
+    Returns:
+        np.ndarray: An (N,) array of ranks between 1 (highest) and 7462 (lowest).
+    Raises:
+        ValueError: If the shapes of hands and boards are not supported.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    hands = np.asarray(hands, dtype=np.int64)
+    boards = np.asarray(boards, dtype=np.int64)
+    if hands.ndim != 2 or hands.shape[1] != 2:
+        raise ValueError(f"Expected hands of shape (N, 2), got {hands.shape}")
+    if boards.ndim != 2 or boards.shape[0] != hands.shape[0]:
+        raise ValueError(
+            f"Expected boards of shape ({hands.shape[0]}, k), got {boards.shape}"
+        )
+    if boards.shape[1] not in (0, 3, 4, 5):
+        raise ValueError(f"Boards must have 0, 3, 4 or 5 cards, got {boards.shape[1]}")
+
+    if boards.shape[1] == 0:
+        return _two_many(hands)
+
+    return evaluate_keys(*card_keys(np.concatenate((hands, boards), axis=1)))
+
+
+def card_keys(cards: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduces each row of cards to the two numbers the lookup tables need:
+    the rank key (the sum of :attr:`LookupTable.RANK_KEYS`) and the suit lanes
+    (each card's rankbits moved into a 13 bit lane for its suit). Both are sums
+    over the cards, so the keys of disjoint sets of cards can be added up,
+    i.e. the keys of hole cards and board can be computed once and every
+    runout card added on top.
+
+    Args:
+        cards (np.ndarray): An (N, k) array of card ints.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The (N,) rank keys and (N,) suit lanes.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    cards = np.asarray(cards, dtype=np.int64)
+    arrays = get_lookup_table().to_numpy()
+
+    keys = arrays.rank_keys[(cards >> 8) & 0xF].sum(axis=1)
+
+    # summing the lanes ORs the suited cards since no card appears twice
+    suit_lane = _get_arrays()["_SUIT_LANE"]
+    lanes = ((cards >> 16) & 0x1FFF) << suit_lane[(cards >> 12) & 0xF]
+    return keys, lanes.sum(axis=1)
+
+
+def index_keys(indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :func:`card_keys` for cards given as indices from 0 to 51.
+
+    Args:
+        indices (np.ndarray): An (N, k) array of card indices.
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The (N,) rank keys and (N,) suit lanes.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    indices = np.asarray(indices, dtype=np.intp)
+    arrays = get_lookup_table().to_numpy()
+    return (
+        arrays.rank_keys[indices >> 2].sum(axis=1),
+        _get_arrays()["_INDEX_TO_LANE"][indices].sum(axis=1),
+    )
+
+
+def evaluate_keys(keys: np.ndarray, lanes: np.ndarray) -> np.ndarray:
+    """
+    Args:
+        keys (np.ndarray): The rank keys of 5, 6 or 7 cards, see :func:`card_keys`.
+        lanes (np.ndarray): The suit lanes of the same cards.
+    Returns:
+        np.ndarray: The ranks between 1 (highest) and 7462 (lowest).
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    arrays = get_lookup_table().to_numpy()
+    ranks = arrays.unsuited[arrays.unsuited_index(keys)]
+
+    # at most one suit can hold 5 or more cards
+    for lane in range(4):
+        flush = arrays.flush[(lanes >> (13 * lane)) & 0x1FFF]
+        ranks = np.where(flush > 0, flush, ranks)
+
+    return ranks.astype(np.int32)
+
+
+def _two_many(hands: np.ndarray) -> np.ndarray:
+    """
+    The batched version of the preflop branch of :meth:`evaluate`.
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    ranks = (hands >> 8) & 0xF
+    suits = (hands >> 12) & 0xF
+    low, high = ranks.min(axis=1), ranks.max(axis=1)
+
+    percentiles = _get_preflop_percentiles()
+    if percentiles is not None:
+        suited = suits[:, 0] == suits[:, 1]
+        classes = np.where(suited, high * 13 + low, low * 13 + high)
+        return (7462 - np.round(percentiles[classes] * 7462)).astype(np.int32)
+
+    two_suited, two_unsuited = _get_two_tables()
+    percentile = np.where(
+        suits[:, 0] == suits[:, 1],
+        np.asarray(two_suited)[low, high],
+        np.asarray(two_unsuited)[ranks[:, 0], ranks[:, 1]],
+    )
+    return (7462 - np.round(percentile * 7462)).astype(np.int32)
 
 
 def get_rank_class(hand_rank: int) -> int:
@@ -78,8 +382,22 @@ def get_rank_class(hand_rank: int) -> int:
     Returns the class of hand given the hand hand_rank
     returned from evaluate.
     """
-    max_rank = min(rank for rank in LOOKUP_TABLE.MAX_TO_RANK_CLASS if hand_rank <= rank)
-    return LOOKUP_TABLE.MAX_TO_RANK_CLASS[max_rank]
+    return _RANK_TO_CLASS[hand_rank]
+
+
+def get_rank_class_many(hand_ranks: np.ndarray) -> np.ndarray:
+    """
+    The batched version of :meth:`get_rank_class`.
+
+    Args:
+        hand_ranks (np.ndarray): An array of ranks given by :meth:`evaluate`
+    Returns:
+        np.ndarray: A ``uint8`` array of the same shape with the rank classes (1-9)
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    return _get_arrays()["RANK_TO_CLASS"][np.asarray(hand_ranks, dtype=np.intp)]
 
 
 def rank_to_string(hand_rank: int) -> str:
@@ -89,7 +407,19 @@ def rank_to_string(hand_rank: int) -> str:
     Returns:
         string: A human-readable string of the hand rank (i.e. Flush, Ace High).
     """
-    return LOOKUP_TABLE.RANK_CLASS_TO_STRING[get_rank_class(hand_rank)]
+    return LookupTable.RANK_CLASS_TO_STRING[get_rank_class(hand_rank)]
+
+
+def rank_to_string_many(hand_ranks: np.ndarray) -> np.ndarray:
+    """
+    The batched version of :meth:`rank_to_string`.
+
+    Args:
+        hand_ranks (np.ndarray): An array of ranks given by :meth:`evaluate`
+    Returns:
+        np.ndarray: A string array of the same shape with the names of the rank classes
+    """
+    return _get_arrays()["_CLASS_STRINGS"][get_rank_class_many(hand_ranks)]
 
 
 def get_five_card_rank_percentage(hand_rank: int) -> float:
@@ -100,4 +430,19 @@ def get_five_card_rank_percentage(hand_rank: int) -> float:
         float: The percentile strength of the given hand_rank (i.e. what percent of hands is worse
             than the given one).
     """
-    return 1 - float(hand_rank) / float(LOOKUP_TABLE.MAX_HIGH_CARD)
+    return 1 - float(hand_rank) / float(LookupTable.MAX_HIGH_CARD)
+
+
+def get_five_card_rank_percentage_many(hand_ranks: np.ndarray) -> np.ndarray:
+    """
+    The batched version of :meth:`get_five_card_rank_percentage`.
+
+    Args:
+        hand_ranks (np.ndarray): An array of ranks given by :meth:`evaluate`
+    Returns:
+        np.ndarray: A ``float64`` array of the same shape with the percentile strengths
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    return 1 - np.asarray(hand_ranks, dtype=np.float64) / LookupTable.MAX_HIGH_CARD
@@ -0,0 +1,150 @@
+"""
+The hand state module evaluates a single player's hand as the board grows.
+It keeps the running rank key and suited cards of :func:`evaluator._seven`,
+so every new board card costs one addition and the rank after it is two
+table lookups, instead of evaluating all the cards again.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+import itertools
+
+from engine.card.card import Card
+from engine.evaluator.evaluator import evaluate, get_rank_class
+from engine.evaluator.lookup_table import LookupTable, get_lookup_table
+
+
+class HandEvaluatorState:
+    """
+    The running evaluation of one player's hole cards and the board.
+
+    Seed it with the hole cards and call :meth:`add_card` (or :meth:`extend`)
+    with every new board card. :attr:`rank` always holds the rank of the
+    current street, as :func:`evaluator.evaluate` would return it.
+    """
+
+    def __init__(self, hole_cards: List[Card], board: Optional[List[Card]] = None):
+        """
+        Arguments:
+            hole_cards (List[Card]): The two hole cards
+            board (Optional[List[Card]]): The board cards dealt so far
+        Raises:
+            ValueError: If there are not exactly two hole cards
+        """
+        if len(hole_cards) != 2:
+            raise ValueError("Exactly two hole cards are needed")
+
+        self.hole_cards = list(hole_cards)
+        self.board: List[Card] = []
+
+        # suited cards OR'd together, indexed by the suit int (1, 2, 4, 8)
+        self._suited = [0] * 9
+        self._key = 0
+        for card in self.hole_cards:
+            self._add_keys(card)
+
+        self.rank = evaluate(self.hole_cards, [])
+        self.street_ranks: Dict[int, int] = {0: self.rank}
+        self._best_five: Optional[List[Card]] = None
+
+        self.extend(board or [])
+
+    def copy(self) -> HandEvaluatorState:
+        """
+        Returns:
+            HandEvaluatorState: An independent copy, without evaluating anything again
+        """
+        state = HandEvaluatorState.__new__(HandEvaluatorState)
+        state.hole_cards = self.hole_cards
+        state.board = list(self.board)
+        state._suited = list(self._suited)
+        state._key = self._key
+        state.rank = self.rank
+        state.street_ranks = dict(self.street_ranks)
+        state._best_five = self._best_five
+        return state
+
+    def _add_keys(self, card: Card):
+        self._key += LookupTable.RANK_KEYS[(card >> 8) & 0xF]
+        self._suited[(card >> 12) & 0xF] |= card
+
+    def add_card(self, card: Card):
+        """
+        Adds a board card, updating the rank once there are 3 to 5 board cards.
+
+        Arguments:
+            card (Card): The new board card
+        Raises:
+            ValueError: If the board already has 5 cards
+        """
+        if len(self.board) == 5:
+            raise ValueError("The board already has 5 cards")
+
+        self.board.append(card)
+        self._add_keys(card)
+        self._best_five = None
+        if len(self.board) < 3:
+            return
+
+        # at most one suit can hold 5 or more cards
+        table = get_lookup_table()
+        rank = 0
+        for suited in (self._suited[1], self._suited[2], self._suited[4], self._suited[8]):
+            rank = table.flush_lookup[suited >> 16]
+            if rank:
+                break
+        if not rank:
+            rank = table.unsuited_lookup[table.unsuited_index(self._key)]
+
+        self.rank = rank
+        self.street_ranks[len(self.board)] = rank
+
+    def extend(self, cards: List[Card]):
+        """
+        Adds board cards one at a time, see :meth:`add_card`.
+
+        Arguments:
+            cards (List[Card]): The new board cards
+        """
+        for card in cards:
+            self.add_card(card)
+
+    @property
+    def rank_class(self) -> int:
+        """
+        Returns:
+            int: The rank class of the current street
+        """
+        return get_rank_class(self.rank)
+
+    def street_rank_classes(self) -> Dict[int, int]:
+        """
+        Returns:
+            Dict[int, int]: Map of the number of board cards (0, 3, 4, 5) -> rank class
+                of the hand on that street
+        """
+        return {
+            num_cards: get_rank_class(rank)
+            for num_cards, rank in self.street_ranks.items()
+        }
+
+    def best_five(self) -> List[Card]:
+        """
+        Returns:
+            List[Card]: The five cards making up the current best hand
+        Raises:
+            ValueError: If there are fewer than 3 board cards
+        """
+        if len(self.board) < 3:
+            raise ValueError("Need at least 3 board cards for a five card hand")
+
+        if self._best_five is None:
+            cards = self.hole_cards + self.board
+            self._best_five = list(
+                min(
+                    itertools.combinations(cards, 5),
+                    key=lambda five: evaluate(list(five[:2]), list(five[2:])),
+                )
+            )
+        return self._best_five
@@ -0,0 +1,178 @@
+"""
+The hand strength module computes the classic hand strength features of a
+hand against one random opponent hand:
+    HS   => chance of being ahead now (ties count half)
+    PPOT => chance of getting ahead with the next board card when behind
+    NPOT => chance of falling behind with the next board card when ahead
+    EHS  => HS * (1 - NPOT) + (1 - HS) * PPOT
+The potentials look one card ahead, so the cost per call stays bounded: on
+the flop every opponent combo is scored on each of the 47 turn cards in one
+vectorized evaluation. Results are memoized by the suit isomorphism class of
+the hand and board (see :mod:`isomorphism`).
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional, Tuple
+import itertools
+
+from engine.card.card import Card
+from engine.card.card_index import to_indices
+from engine.card.card_set import CardSet, masks_from_indices
+from engine.evaluator.evaluator import evaluate, evaluate_keys, index_keys
+from engine.evaluator.isomorphism import canonical_key, get_cache
+from engine.evaluator.preflop import get_preflop_equity
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# current state => final state, ahead/tied/behind
+_AHEAD, _TIED, _BEHIND = 0, 1, 2
+
+
+@dataclass(frozen=True)
+class HandStrength:
+    """The hand strength features of a hand, all between 0 and 1."""
+
+    hs: float
+    """Chance of being ahead of a random hand now, ties count half."""
+
+    ppot: float
+    """Chance of getting ahead with the next card while behind or tied."""
+
+    npot: float
+    """Chance of falling behind with the next card while ahead or tied."""
+
+    ehs: float
+    """Effective hand strength, HS * (1 - NPOT) + (1 - HS) * PPOT."""
+
+
+_COMBOS: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+
+def _get_combos() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The (1326, 2) card indices of every two
+            card combo and their card set masks, built on the first call
+    """
+    global _COMBOS  # pylint: disable=global-statement
+    if _COMBOS is None:
+        # pylint: disable=import-outside-toplevel
+        import numpy as np
+
+        combos = np.array(list(itertools.combinations(range(52), 2)), dtype=np.int64)
+        _COMBOS = combos, masks_from_indices(combos)
+    return _COMBOS
+
+
+def _states(hero_ranks: np.ndarray, opponent_ranks: np.ndarray) -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: _AHEAD, _TIED or _BEHIND for every hero and opponent rank
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    return np.where(
+        hero_ranks < opponent_ranks,
+        _AHEAD,
+        np.where(hero_ranks == opponent_ranks, _TIED, _BEHIND),
+    )
+
+
+def _hand_strength(hole_cards: List[Card], board: List[Card]) -> HandStrength:
+    """The uncached :func:`hand_strength`."""
+    if not board:
+        # no board to compare on, the preflop equity against a random hand
+        preflop_equity = get_preflop_equity()
+        if preflop_equity is not None:
+            hs = preflop_equity.equity(hole_cards)
+        else:
+            hs = 1 - (evaluate(hole_cards, []) - 1) / 7461
+        return HandStrength(hs=hs, ppot=0.0, npot=0.0, ehs=hs)
+
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    hole, board_indices = to_indices(hole_cards), to_indices(board)
+    dead = CardSet.from_indices(hole + board_indices)
+    combos, combo_masks = _get_combos()
+    opponents = combos[(combo_masks & np.uint64(dead.mask)) == 0]
+
+    hero_key, hero_lane = index_keys([hole + board_indices])
+    board_key, board_lane = index_keys([board_indices])
+    opponent_keys, opponent_lanes = index_keys(opponents)
+    opponent_keys, opponent_lanes = opponent_keys + board_key, opponent_lanes + board_lane
+
+    now = _states(
+        evaluate_keys(hero_key, hero_lane), evaluate_keys(opponent_keys, opponent_lanes)
+    )
+    hs = float(((now == _AHEAD) + 0.5 * (now == _TIED)).mean())
+    if len(board) == 5:
+        return HandStrength(hs=hs, ppot=0.0, npot=0.0, ehs=hs)
+
+    # every next card against every opponent combo not holding it
+    next_cards = np.array(dead.complement().indices(), dtype=np.int64)
+    card_keys, card_lanes = index_keys(next_cards[:, None])
+    hero_next = evaluate_keys(hero_key + card_keys, hero_lane + card_lanes)
+    opponent_next = evaluate_keys(
+        (opponent_keys[None, :] + card_keys[:, None]).ravel(),
+        (opponent_lanes[None, :] + card_lanes[:, None]).ravel(),
+    ).reshape(len(next_cards), len(opponents))
+    valid = (opponents[None, :, 0] != next_cards[:, None]) & (
+        opponents[None, :, 1] != next_cards[:, None]
+    )
+
+    after = _states(hero_next[:, None], opponent_next)
+    transitions = np.bincount(
+        (np.broadcast_to(now, after.shape) * 3 + after)[valid], minlength=9
+    ).reshape(3, 3)
+    totals = transitions.sum(axis=1)
+
+    ppot_total = totals[_BEHIND] + totals[_TIED] / 2
+    ppot = (
+        transitions[_BEHIND, _AHEAD]
+        + transitions[_BEHIND, _TIED] / 2
+        + transitions[_TIED, _AHEAD] / 2
+    ) / ppot_total if ppot_total else 0.0
+
+    npot_total = totals[_AHEAD] + totals[_TIED] / 2
+    npot = (
+        transitions[_AHEAD, _BEHIND]
+        + transitions[_TIED, _BEHIND] / 2
+        + transitions[_AHEAD, _TIED] / 2
+    ) / npot_total if npot_total else 0.0
+
+    ppot, npot = float(ppot), float(npot)
+    return HandStrength(
+        hs=hs, ppot=ppot, npot=npot, ehs=hs * (1 - npot) + (1 - hs) * ppot
+    )
+
+
+def hand_strength(hole_cards: List[Card], board: List[Card]) -> HandStrength:
+    """
+    Computes HS, PPOT, NPOT and EHS of a hand against one random opponent hand.
+    Preflop there is no board to compare on, so HS and EHS are the equity
+    against a random hand (see :mod:`preflop`) and the potentials are 0, as on
+    the river.
+
+    Args:
+        hole_cards (list[Card]): The two hole cards.
+        board (list[Card]): The 0, 3, 4 or 5 board cards.
+    Returns:
+        HandStrength: The features of the hand
+    Raises:
+        ValueError: If the number of cards is not supported
+    """
+    if len(hole_cards) != 2:
+        raise ValueError("Exactly two hole cards are needed")
+    if len(board) not in (0, 3, 4, 5):
+        raise ValueError(f"Board must have 0, 3, 4 or 5 cards, got {len(board)}")
+
+    cache = get_cache("hand_strength")
+    return cache.get_or_compute(
+        canonical_key([hole_cards, board]),
+        lambda: _hand_strength(list(hole_cards), list(board)),
+    )
@@ -0,0 +1,300 @@
+"""
+The isomorphism module maps card situations that only differ by a
+permutation of the suits to the same canonical key, i.e. Ah Kh on 2h 7s 9s
+and As Ks on 2s 7d 9d. There are only 1,755 such classes of flops
+(see :func:`flop_index`).
+
+A situation is a list of card groups (i.e. the hole cards and the board,
+or several players' hands and the board). Every suit gets a signature, the
+rankbits of its cards in each group, and the key is the sorted signatures,
+so it does not matter which suit is which.
+
+The keys index a set of bounded LRU caches (see :func:`get_cache`) shared by
+the evaluator and the equity code, whose hit rates and sizes are reported by
+:func:`cache_stats`.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, List, Optional, Sequence
+import itertools
+
+from engine.card.card import Card
+from engine.card.card_index import INDEX_TO_CARD
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# suit int (1, 2, 4, 8) => suit index (0-3)
+_SUIT_INDEX = (0, 0, 1, 0, 2, 0, 0, 0, 3)
+_SUITS = tuple(Card.CHAR_SUIT_TO_INT_SUIT.values())
+
+
+def _signatures(groups: Sequence[Sequence[Card]]) -> List[int]:
+    """
+    Returns:
+        List[int]: For every suit, the rankbits of its cards in each group
+            packed into 13 bits per group
+    """
+    signatures = [0, 0, 0, 0]
+    for shift, cards in zip(itertools.count(0, 13), groups):
+        for card in cards:
+            signatures[_SUIT_INDEX[(card >> 12) & 0xF]] |= ((card >> 16) & 0x1FFF) << shift
+    return signatures
+
+
+def canonical_key(groups: Sequence[Sequence[Card]]) -> int:
+    """
+    Arguments:
+        groups (Sequence[Sequence[Card]]): The card groups, i.e. [hole_cards, board].
+            The order of the groups matters, the order within a group does not.
+    Returns:
+        int: A key that is equal for two situations exactly when they are the same
+            up to a permutation of the suits
+    """
+    key = 0
+    for signature in sorted(_signatures(groups), reverse=True):
+        key = (key << (13 * len(groups))) | signature
+    return key << 4 | len(groups)
+
+
+def canonical_cards(groups: Sequence[Sequence[Card]]) -> List[List[Card]]:
+    """
+    Arguments:
+        groups (Sequence[Sequence[Card]]): The card groups, see :func:`canonical_key`
+    Returns:
+        List[List[Card]]: The same groups with the suits renamed so that every
+            situation of a class gives the same cards (up to order within a group)
+    """
+    signatures = _signatures(groups)
+    order = sorted(range(4), key=lambda suit_index: signatures[suit_index], reverse=True)
+    renamed = {_SUITS[suit_index]: _SUITS[i] for i, suit_index in enumerate(order)}
+    return [
+        sorted(
+            Card.from_int(card & ~0xF000 | renamed[(card >> 12) & 0xF] << 12)
+            for card in cards
+        )
+        for cards in groups
+    ]
+
+
+_SUIT_PERMUTATIONS: Optional[np.ndarray] = None
+
+
+def _get_suit_permutations() -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: The (24, 4) permutations of the suit indices, built on the
+            first call
+    """
+    global _SUIT_PERMUTATIONS  # pylint: disable=global-statement
+    if _SUIT_PERMUTATIONS is None:
+        # pylint: disable=import-outside-toplevel
+        import numpy as np
+
+        _SUIT_PERMUTATIONS = np.array(
+            list(itertools.permutations(range(4))), dtype=np.int64
+        )
+    return _SUIT_PERMUTATIONS
+
+
+def __getattr__(name: str):
+    # SUIT_PERMUTATIONS is kept as a NumPy module attribute, built when first
+    # accessed
+    if name == "SUIT_PERMUTATIONS":
+        return _get_suit_permutations()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def canonical_board_codes(boards: np.ndarray) -> tuple:
+    """
+    The vectorized canonical form of boards given as card indices: the
+    smallest code of the sorted board under any suit permutation, 6 bits
+    per card.
+
+    Arguments:
+        boards (np.ndarray): (N, k) boards as card indices
+    Returns:
+        tuple: The (N,) canonical codes and the (N,) index into
+            :data:`SUIT_PERMUTATIONS` of the permutation giving them
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    boards = np.asarray(boards, dtype=np.int64)
+    ranks, suits = boards // 4, boards % 4
+    shifts = np.arange(0, 6 * boards.shape[1], 6)
+
+    codes = np.full(len(boards), np.iinfo(np.int64).max)
+    perm_ids = np.zeros(len(boards), dtype=np.int64)
+    for perm_id, perm in enumerate(_get_suit_permutations()):
+        permuted = np.sort(ranks * 4 + perm[suits], axis=1)
+        code = (permuted << shifts).sum(axis=1)
+        smaller = code < codes
+        codes[smaller] = code[smaller]
+        perm_ids[smaller] = perm_id
+    return codes, perm_ids
+
+
+def canonical_boards(num_cards: int) -> tuple:
+    """
+    Reduces the C(52, num_cards) boards to one board per class of suit
+    permutations.
+
+    Arguments:
+        num_cards (int): The size of the boards
+    Returns:
+        tuple: The (M, num_cards) canonical boards as card indices, how many
+            boards each one stands for and their sorted canonical codes
+    """
+    # pylint: disable=import-outside-toplevel
+    import numpy as np
+
+    boards = np.fromiter(
+        itertools.chain.from_iterable(itertools.combinations(range(52), num_cards)),
+        dtype=np.int8,
+    ).reshape(-1, num_cards)
+
+    # in chunks, the permuted copies of all 2.6M rivers don't fit comfortably
+    codes = np.concatenate(
+        [
+            canonical_board_codes(boards[i : i + 500_000])[0]
+            for i in range(0, len(boards), 500_000)
+        ]
+    )
+    codes, counts = np.unique(codes, return_counts=True)
+    return (codes[:, None] >> np.arange(0, 6 * num_cards, 6)) & 0x3F, counts, codes
+
+
+_FLOP_INDEX: Optional[Dict[int, int]] = None
+
+
+def flop_index(board: Sequence[Card]) -> int:
+    """
+    Arguments:
+        board (Sequence[Card]): The three flop cards
+    Returns:
+        int: The index of the flop's suit isomorphism class, 0 to 1754
+    """
+    global _FLOP_INDEX  # pylint: disable=global-statement
+    if _FLOP_INDEX is None:
+        _FLOP_INDEX = {}
+        for flop in itertools.combinations(INDEX_TO_CARD, 3):
+            _FLOP_INDEX.setdefault(canonical_key([flop]), len(_FLOP_INDEX))
+    return _FLOP_INDEX[canonical_key([board])]
+
+
+class LRUCache:
+    """
+    A dictionary holding at most maxsize entries, dropping the least recently
+    used one when full. Counts its hits, misses and evictions.
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        """
+        Arguments:
+            name (str): The name of the cache in :func:`cache_stats`
+            maxsize (int): How many entries to keep at most
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Arguments:
+            key (Hashable): The key to look up
+            default (Any): The value if the key is missing, defaults to None
+        Returns:
+            Any: The cached value or the default
+        """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Arguments:
+            key (Hashable): The key to store the value under
+            value (Any): The value
+        """
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Arguments:
+            key (Hashable): The key to look up
+            compute (Callable[[], Any]): Computes the value on a miss
+        Returns:
+            Any: The cached or freshly computed value
+        """
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            value = compute()
+            self.put(key, value)
+            return value
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def clear(self):
+        """Drops every entry and resets the counters."""
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns:
+            Dict[str, float]: The size, maxsize, hits, misses, evictions and hit rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+_CACHES: Dict[str, LRUCache] = {}
+
+
+def get_cache(name: str, maxsize: int = 65536) -> LRUCache:
+    """
+    Arguments:
+        name (str): The name of the cache, i.e. "exact_equity"
+        maxsize (int): The size of the cache if it is created by this call
+    Returns:
+        LRUCache: The shared cache with the given name
+    """
+    if name not in _CACHES:
+        _CACHES[name] = LRUCache(name, maxsize)
+    return _CACHES[name]
+
+
+def cache_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Returns:
+        Dict[str, Dict[str, float]]: The :meth:`LRUCache.stats` of every shared cache
+    """
+    return {name: cache.stats() for name, cache in _CACHES.items()}
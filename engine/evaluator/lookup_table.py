@@ -1,6 +1,8 @@
 """
 The lookup table module keeps the books on all possible hand strengths.
-We construct the table once on import and reference it repeatedly.
+We construct the table once, save it to a file (see :func:`load_lookup_table`)
+and memory map that file on first use (see :func:`get_lookup_table`), so every
+process shares the same pages and importing the module stays cheap.
 Number of Distinct Hand Values:
 Straight Flush   10
 Four of a Kind   156      [(13 choose 2) * (2 choose 1)]
@@ -13,19 +15,86 @@ One Pair         2860     [(13 choose 4) * (4 choose 1)]
 High card      + 1277     [(13 choose 5) - 10 straights]
 -------------------------
 TOTAL            7462
-Here we create a lookup table which maps:
-    5 card hand's unique prime product => rank in range [1, 7462]
+Here we create two lookup tables which map:
+    flush rankbits (5 to 7 bits set)        => rank of the best flush
+    rank counts of any other 5, 6 or 7 cards => rank of the best 5 card hand
+so a whole hand can be evaluated with a single lookup.
+
+Both are flat arrays of ranks. The flush table is indexed directly by the
+13-bit rankbits of the suited cards. The other table is indexed by a minimal
+perfect hash of the rank counts: every card adds 5^rank to a key, so the key
+holds the count of each rank as a base-5 digit. The low digits (deuce to
+eight) and the high digits (nine to ace) are looked up in two small arrays
+whose sum is the index, see :meth:`LookupTable.unsuited_index`.
 Examples:
 * Royal flush (best hand possible)          => 1
 * 7-5-4-3-2 unsuited (worst hand possible)  => 7462
 """
 
-from typing import Dict
+from __future__ import annotations
+
+from array import array
+from typing import TYPE_CHECKING, Optional, Union
+from dataclasses import dataclass
 import itertools
+import mmap
+import os
+import struct
+import tempfile
+import zlib
 
-from engine.card import card
 from engine.card.card import Card
 
+if TYPE_CHECKING:
+    import numpy as np
+
+
+LOOKUP_TABLE_PATH = os.environ.get(
+    "POKER_LOOKUP_TABLE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "lookup_table.bin"),
+)
+"""Where the tables are saved, can be set with the POKER_LOOKUP_TABLE
+environment variable."""
+
+
+class LookupTableFileError(Exception):
+    """
+    LookupTable will throw this error if a table file is missing sections,
+    has the wrong version or does not match its checksum.
+    """
+
+
+@dataclass(frozen=True)
+class LookupArrays:
+    """The lookup tables as NumPy arrays (sharing memory with the
+    tables), for evaluating many hands at once."""
+
+    flush: np.ndarray
+    """Indexed by rankbits, the rank of the best flush or 0 if
+    fewer than 5 bits are set."""
+
+    unsuited: np.ndarray
+    """Indexed by :meth:`LookupTable.unsuited_index`, the rank of
+    the best non-flush hand."""
+
+    low_offsets: np.ndarray
+    """Indexed by the low base-5 digits of the rank key."""
+
+    high_index: np.ndarray
+    """Indexed by the high base-5 digits of the rank key."""
+
+    rank_keys: np.ndarray
+    """Indexed by rank, the amount each card adds to the rank key."""
+
+    def unsuited_index(self, keys: np.ndarray) -> np.ndarray:
+        """
+        The batched version of :meth:`LookupTable.unsuited_index`.
+        """
+        return (
+            self.low_offsets[keys % LookupTable.QUINARY_SPLIT]
+            + self.high_index[keys // LookupTable.QUINARY_SPLIT]
+        )
+
 
 class LookupTable:
     # pylint: disable=too-few-public-methods
@@ -67,19 +136,227 @@ class LookupTable:
         9: "High card",
     }
 
+    RANK_KEYS = tuple(5**i for i in Card.INT_RANKS)
+    QUINARY_SPLIT = 5**7
+
+    # table file layout, bump FILE_VERSION whenever the tables change
+    FILE_MAGIC = b"PKLT"
+    FILE_VERSION = 1
+    FILE_TABLES = ("flush_lookup", "unsuited_lookup", "low_offsets", "high_index")
+    _FILE_HEADER = struct.Struct("=4sIII")  # magic, version, crc32, num tables
+    _FILE_SECTION = struct.Struct("=16scxxxQQ")  # name, typecode, offset, length
+
     def __init__(self):
         """
         Calculates lookup tables
         """
-        # create dictionaries
-        self.flush_lookup: Dict[int, int] = {}
-        self.unsuited_lookup: Dict[int, int] = {}
+        # the flush table is indexed by the 13 bit rankbits
+        self.flush_lookup = array("H", bytes(2 * (1 << 13)))
+        self._arrays: Optional[LookupArrays] = None
+
+        # create the perfect hash, this sizes self.unsuited_lookup
+        self._perfect_hash()
 
         # create the lookup table in piecewise fashion
         self._flushes()  # this will call straights and high card method,
         # we reuse some of the bit sequences
         self._multiples()
 
+        # the 6 and 7 card entries are built from the 5 card ones
+        self._sevens()
+
+    def to_numpy(self) -> LookupArrays:
+        """
+        Returns:
+            LookupArrays: The tables as NumPy arrays, without copying them.
+        """
+        if self._arrays is None:
+            # pylint: disable=import-outside-toplevel
+            import numpy as np
+
+            self._arrays = LookupArrays(
+                flush=np.frombuffer(self.flush_lookup, dtype=np.uint16),
+                unsuited=np.frombuffer(self.unsuited_lookup, dtype=np.uint16),
+                low_offsets=np.frombuffer(self.low_offsets, dtype=np.int32),
+                high_index=np.frombuffer(self.high_index, dtype=np.uint16),
+                rank_keys=np.array(LookupTable.RANK_KEYS, dtype=np.int64),
+            )
+
+        return self._arrays
+
+    def save(self, path: Union[str, os.PathLike]):
+        """
+        Writes the tables to the given file. The file is written under a temporary
+        name and then moved into place, so processes racing to save the tables
+        never see a partial file.
+
+        Arguments:
+            path (Union[str, os.PathLike]): The file to write the tables to
+        """
+        tables = [getattr(self, name) for name in LookupTable.FILE_TABLES]
+        start = LookupTable._FILE_HEADER.size + LookupTable._FILE_SECTION.size * len(
+            tables
+        )
+
+        sections, payload = [], bytearray()
+        for name, table in zip(LookupTable.FILE_TABLES, tables):
+            # keep every table 8 byte aligned within the file
+            payload += bytes(-(start + len(payload)) % 8)
+            sections.append(
+                LookupTable._FILE_SECTION.pack(
+                    name.encode(),
+                    memoryview(table).format.encode(),
+                    start + len(payload),
+                    len(table),
+                )
+            )
+            payload += memoryview(table).tobytes()
+
+        body = b"".join(sections) + payload
+        header = LookupTable._FILE_HEADER.pack(
+            LookupTable.FILE_MAGIC,
+            LookupTable.FILE_VERSION,
+            zlib.crc32(body),
+            len(tables),
+        )
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(header + body)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def from_file(cls, path: Union[str, os.PathLike]) -> LookupTable:
+        """
+        Memory maps the tables saved by :meth:`save`. The tables are read-only
+        views into the mapping, the pages are shared by every process that
+        maps the same file.
+
+        Arguments:
+            path (Union[str, os.PathLike]): The file to read the tables from
+        Returns:
+            LookupTable: The lookup table backed by the file
+        Raises:
+            OSError: If the file cannot be opened
+            LookupTableFileError: If the file is not a valid table file of this version
+        """
+        with open(path, "rb") as file:
+            try:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as err:  # empty file
+                raise LookupTableFileError(f"Empty lookup table file {path}") from err
+
+        view = memoryview(mapping)
+        header_size = LookupTable._FILE_HEADER.size
+        if len(view) < header_size:
+            raise LookupTableFileError(f"Truncated lookup table file {path}")
+
+        magic, version, checksum, num_tables = LookupTable._FILE_HEADER.unpack(
+            view[:header_size]
+        )
+        if magic != LookupTable.FILE_MAGIC or version != LookupTable.FILE_VERSION:
+            raise LookupTableFileError(
+                f"Lookup table file {path} has version {version}, "
+                f"expected {LookupTable.FILE_VERSION}"
+            )
+        if zlib.crc32(view[header_size:]) != checksum:
+            raise LookupTableFileError(f"Checksum mismatch in lookup table file {path}")
+
+        table = cls.__new__(cls)
+        table._arrays = None
+        table._mmap = mapping
+
+        for i in range(num_tables):
+            start = header_size + i * LookupTable._FILE_SECTION.size
+            name, typecode, offset, length = LookupTable._FILE_SECTION.unpack(
+                view[start : start + LookupTable._FILE_SECTION.size]
+            )
+            name, typecode = name.rstrip(b"\0").decode(), typecode.decode()
+            itemsize = array(typecode).itemsize
+            setattr(
+                table,
+                name,
+                view[offset : offset + length * itemsize].cast(typecode),
+            )
+
+        missing = [name for name in cls.FILE_TABLES if not hasattr(table, name)]
+        if missing:
+            raise LookupTableFileError(f"Lookup table file {path} is missing {missing}")
+
+        return table
+
+    def unsuited_index(self, key: int) -> int:
+        """
+        Arguments:
+            key (int): The sum of :attr:`RANK_KEYS` over the ranks of 5, 6 or 7 cards.
+        Returns:
+            int: The index of the hand in :attr:`unsuited_lookup`.
+        """
+        return (
+            self.low_offsets[key % LookupTable.QUINARY_SPLIT]
+            + self.high_index[key // LookupTable.QUINARY_SPLIT]
+        )
+
+    @staticmethod
+    def rankbits_key(rankbits: int) -> int:
+        """
+        Arguments:
+            rankbits (int): 13 bits, one for each distinct rank in the hand.
+        Returns:
+            int: The rank key (see :meth:`unsuited_index`) of the ranks.
+        """
+        return sum(
+            LookupTable.RANK_KEYS[i] for i in Card.INT_RANKS if rankbits & (1 << i)
+        )
+
+    def _perfect_hash(self):
+        """
+        Minimal perfect hash over the rank counts of 5, 6 and 7 cards.
+        The high digits of the key (nine to ace) hold at most 7 cards and
+        are numbered in order of how many cards they hold. The high parts
+        that complete a given low part (deuce to eight) to 5, 6 or 7 cards are
+        then a contiguous run of these numbers, so the low part only needs
+        an offset to the start of its own run.
+        """
+        num_low = 7
+        num_high = len(Card.INT_RANKS) - num_low
+
+        # number the high parts by how many cards they hold
+        high_by_size = [[] for _ in range(8)]
+        for counts in itertools.product(range(5), repeat=num_high):
+            if sum(counts) <= 7:
+                high_by_size[sum(counts)].append(
+                    sum(count * 5**i for i, count in enumerate(counts))
+                )
+
+        self.high_index = array("H", bytes(2 * 5**num_high))
+        size_start = [0]
+        for keys in high_by_size:
+            for i, key in enumerate(keys, size_start[-1]):
+                self.high_index[key] = i
+            size_start.append(size_start[-1] + len(keys))
+
+        # a run for each low part that has room for the high part
+        self.low_offsets = array("i", bytes(4 * 5**num_low))
+        num_hands = 0
+        for counts in itertools.product(range(5), repeat=num_low):
+            size = sum(counts)
+            if size > 7:
+                continue
+
+            first, last = max(0, 5 - size), 7 - size
+            key = sum(count * 5**i for i, count in enumerate(counts))
+            self.low_offsets[key] = num_hands - size_start[first]
+            num_hands += size_start[last + 1] - size_start[first]
+
+        self.unsuited_lookup = array("H", bytes(2 * num_hands))
+
     def _flushes(self):
         """
         Straight flushes and flushes.
@@ -134,16 +411,14 @@ class LookupTable:
         # rank 1 = Royal Flush!
         rank = 1
         for straight_flush in straight_flushes:
-            prime_product = card.prime_product_from_rankbits(straight_flush)
-            self.flush_lookup[prime_product] = rank
+            self.flush_lookup[straight_flush] = rank
             rank += 1
 
         # we start the counting for flushes on max full house, which
         # is the worst rank that a full house can have (2,2,2,3,3)
         rank = LookupTable.MAX_FULL_HOUSE + 1
         for flush in flushes:
-            prime_product = card.prime_product_from_rankbits(flush)
-            self.flush_lookup[prime_product] = rank
+            self.flush_lookup[flush] = rank
             rank += 1
 
         # we can reuse these bit sequences for straights
@@ -159,14 +434,14 @@ class LookupTable:
         rank = LookupTable.MAX_FLUSH + 1
 
         for straight in straights:
-            prime_product = card.prime_product_from_rankbits(straight)
-            self.unsuited_lookup[prime_product] = rank
+            key = LookupTable.rankbits_key(straight)
+            self.unsuited_lookup[self.unsuited_index(key)] = rank
             rank += 1
 
         rank = LookupTable.MAX_PAIR + 1
         for high_card in highcards:
-            prime_product = card.prime_product_from_rankbits(high_card)
-            self.unsuited_lookup[prime_product] = rank
+            key = LookupTable.rankbits_key(high_card)
+            self.unsuited_lookup[self.unsuited_index(key)] = rank
             rank += 1
 
     def _multiples(self):
@@ -175,6 +450,7 @@ class LookupTable:
         Pair, Two Pair, Three of a Kind, Full House, and 4 of a Kind.
         """
         backwards_ranks = range(len(Card.INT_RANKS) - 1, -1, -1)
+        keys = LookupTable.RANK_KEYS
 
         # 1) Four of a Kind
         rank = LookupTable.MAX_STRAIGHT_FLUSH + 1
@@ -186,8 +462,8 @@ class LookupTable:
             kickers = list(backwards_ranks[:])
             kickers.remove(i)
             for k in kickers:
-                product = Card.PRIMES[i] ** 4 * Card.PRIMES[k]
-                self.unsuited_lookup[product] = rank
+                key = 4 * keys[i] + keys[k]
+                self.unsuited_lookup[self.unsuited_index(key)] = rank
                 rank += 1
 
         # 2) Full House
@@ -200,8 +476,8 @@ class LookupTable:
             pair_ranks = list(backwards_ranks[:])
             pair_ranks.remove(i)
             for pair_rank in pair_ranks:
-                product = Card.PRIMES[i] ** 3 * Card.PRIMES[pair_rank] ** 2
-                self.unsuited_lookup[product] = rank
+                key = 3 * keys[i] + 2 * keys[pair_rank]
+                self.unsuited_lookup[self.unsuited_index(key)] = rank
                 rank += 1
 
         # 3) Three of a Kind
@@ -215,10 +491,8 @@ class LookupTable:
 
             for kickers in itertools.combinations(kickers, 2):
                 card1, card2 = kickers
-                product = (
-                    Card.PRIMES[b_rank] ** 3 * Card.PRIMES[card1] * Card.PRIMES[card2]
-                )
-                self.unsuited_lookup[product] = rank
+                key = 3 * keys[b_rank] + keys[card1] + keys[card2]
+                self.unsuited_lookup[self.unsuited_index(key)] = rank
                 rank += 1
 
         # 4) Two Pair
@@ -231,12 +505,8 @@ class LookupTable:
             kickers.remove(pair1)
             kickers.remove(pair2)
             for kicker in kickers:
-                product = (
-                    Card.PRIMES[pair1] ** 2
-                    * Card.PRIMES[pair2] ** 2
-                    * Card.PRIMES[kicker]
-                )
-                self.unsuited_lookup[product] = rank
+                key = 2 * keys[pair1] + 2 * keys[pair2] + keys[kicker]
+                self.unsuited_lookup[self.unsuited_index(key)] = rank
                 rank += 1
 
         # 5) Pair
@@ -250,15 +520,52 @@ class LookupTable:
 
             for kickers in itertools.combinations(kickers, 3):
                 kicker1, kicker2, kicker3 = kickers
-                product = (
-                    Card.PRIMES[pairrank] ** 2
-                    * Card.PRIMES[kicker1]
-                    * Card.PRIMES[kicker2]
-                    * Card.PRIMES[kicker3]
-                )
-                self.unsuited_lookup[product] = rank
+                key = 2 * keys[pairrank] + keys[kicker1] + keys[kicker2] + keys[kicker3]
+                self.unsuited_lookup[self.unsuited_index(key)] = rank
                 rank += 1
 
+    def _sevens(self):
+        """
+        Best 5 card ranks for hands of 6 and 7 cards.
+        The best hand of n cards is the best of the n-card hands with one
+        card removed, so each size is built from the one before it.
+        Done with NumPy over all hands of a size at once.
+        """
+        # pylint: disable=import-outside-toplevel
+        import numpy as np
+
+        arrays = self.to_numpy()
+        ranks = np.arange(len(Card.INT_RANKS))
+
+        # flushes: rankbits with 6 and then 7 bits set
+        rankbits = np.arange(1 << 13)
+        has_bit = (rankbits[:, None] >> ranks) & 1
+        for num_cards in (6, 7):
+            hands = rankbits[has_bit.sum(axis=1) == num_cards]
+            smaller = arrays.flush[hands[:, None] ^ (1 << ranks)]
+            arrays.flush[hands] = np.where(
+                (hands[:, None] >> ranks) & 1, smaller, np.iinfo(np.uint16).max
+            ).min(axis=1)
+
+        # everything else: the rank keys of 5 cards, then 6, then 7
+        keys = np.zeros(1, dtype=np.int64)
+        for num_cards in range(1, 8):
+            digits = (keys[:, None] // arrays.rank_keys) % 5
+            keys = np.unique((keys[:, None] + arrays.rank_keys)[digits < 4])
+            if num_cards < 6:
+                continue
+
+            # remove one card of each rank the hand holds
+            digits = (keys[:, None] // arrays.rank_keys) % 5
+            smaller = arrays.unsuited[
+                arrays.unsuited_index(
+                    keys[:, None] - np.where(digits > 0, arrays.rank_keys, 0)
+                )
+            ]
+            arrays.unsuited[arrays.unsuited_index(keys)] = np.where(
+                digits > 0, smaller, np.iinfo(np.uint16).max
+            ).min(axis=1)
+
     @staticmethod
     def _get_lexographically_next_bit_sequence(bits):
         """
@@ -278,4 +585,47 @@ class LookupTable:
             yield lexo_next
 
 
-LOOKUP_TABLE = LookupTable()
+def load_lookup_table(path: Union[str, os.PathLike] = LOOKUP_TABLE_PATH) -> LookupTable:
+    """
+    Memory maps the tables in the given file, (re)generating the file first if
+    it is missing, from another version or corrupt. If the file cannot be written,
+    the freshly built in-memory tables are used instead.
+
+    Arguments:
+        path (Union[str, os.PathLike]): The table file, defaults to LOOKUP_TABLE_PATH
+    Returns:
+        LookupTable: The lookup table
+    """
+    try:
+        return LookupTable.from_file(path)
+    except (OSError, LookupTableFileError):
+        pass
+
+    table = LookupTable()
+    try:
+        table.save(path)
+        return LookupTable.from_file(path)
+    except (OSError, LookupTableFileError):
+        return table
+
+
+_LOOKUP_TABLE: Optional[LookupTable] = None
+
+
+def get_lookup_table() -> LookupTable:
+    """
+    Returns:
+        LookupTable: The shared lookup table, loaded by :func:`load_lookup_table`
+            on the first call.
+    """
+    global _LOOKUP_TABLE  # pylint: disable=global-statement
+    if _LOOKUP_TABLE is None:
+        _LOOKUP_TABLE = load_lookup_table()
+    return _LOOKUP_TABLE
+
+
+def __getattr__(name: str):
+    # LOOKUP_TABLE is kept as a module attribute, loaded when first accessed
+    if name == "LOOKUP_TABLE":
+        return get_lookup_table()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,205 @@
+"""
+The preflop module holds the all-in equities of the 169 starting hand classes:
+    heads_up[a, b]       => equity of class a against class b
+    versus_random[a, n]  => equity of class a against n + 1 random hands
+Each class is a pair, a suited or an offsuit combination of two ranks, indexed
+like a 13x13 grid (see :func:`hand_class`).
+
+The tables are generated once by :mod:`engine.evaluator.preflop_build` and
+saved to a small checksummed binary file that is memory mapped on first use
+(see :func:`get_preflop_equity`). This module only reads them, so it stays
+cheap to import.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, List, Optional, Union
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+from engine.card.card import Card
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+PREFLOP_EQUITY_PATH = os.environ.get(
+    "POKER_PREFLOP_EQUITY",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "preflop_equity.bin"),
+)
+"""Where the tables are saved, can be set with the POKER_PREFLOP_EQUITY
+environment variable."""
+
+NUM_CLASSES = 169
+MAX_OPPONENTS = 9
+
+_FILE_MAGIC = b"PKPF"
+_FILE_VERSION = 1
+_FILE_HEADER = struct.Struct("=4sIII")
+
+
+class PreflopEquityFileError(Exception):
+    """
+    PreflopEquity will throw this error if a table file has the wrong
+    version, size or does not match its checksum.
+    """
+
+
+def hand_class(cards: List[Card]) -> int:
+    """
+    The starting hand class of two cards. Pairs are on the diagonal of a 13x13
+    grid, suited hands above it (high rank row) and offsuit hands below it
+    (low rank row).
+
+    Arguments:
+        cards (List[Card]): The two hole cards
+    Returns:
+        int: The class in the range [0, 169)
+    """
+    rank0, rank1 = (cards[0] >> 8) & 0xF, (cards[1] >> 8) & 0xF
+    high, low = max(rank0, rank1), min(rank0, rank1)
+    if (cards[0] ^ cards[1]) & 0xF000 == 0:
+        return high * 13 + low
+    return low * 13 + high
+
+
+def class_to_string(hand_class_id: int) -> str:
+    """
+    Arguments:
+        hand_class_id (int): The class given by :func:`hand_class`
+    Returns:
+        str: The class in the usual notation, i.e. AKs, T9o or 77
+    """
+    row, col = divmod(hand_class_id, 13)
+    if row == col:
+        return Card.STR_RANKS[row] * 2
+    if row > col:
+        return Card.STR_RANKS[row] + Card.STR_RANKS[col] + "s"
+    return Card.STR_RANKS[col] + Card.STR_RANKS[row] + "o"
+
+
+@dataclass(frozen=True)
+class PreflopEquity:
+    """The preflop equity tables, see the module docstring."""
+
+    heads_up: np.ndarray
+    """(169, 169) equity of a class against another."""
+
+    versus_random: np.ndarray
+    """(169, 9) equity of a class against 1 to 9 random hands."""
+
+    def equity(self, cards: List[Card], num_opponents: int = 1) -> float:
+        """
+        Arguments:
+            cards (List[Card]): The two hole cards
+            num_opponents (int): How many random hands to play against, 1 to 9
+        Returns:
+            float: The all-in equity of the hand
+        """
+        return float(self.versus_random[hand_class(cards), num_opponents - 1])
+
+    def equity_against(self, cards: List[Card], other_cards: List[Card]) -> float:
+        """
+        Arguments:
+            cards (List[Card]): The two hole cards
+            other_cards (List[Card]): The opponent's two hole cards
+        Returns:
+            float: The all-in equity of the hand's class against the opponent's
+                class, averaged over their suit combinations
+        """
+        return float(self.heads_up[hand_class(cards), hand_class(other_cards)])
+
+    def save(self, path: Union[str, os.PathLike]):
+        """
+        Writes the tables to the given file, under a temporary name that is
+        then moved into place.
+
+        Arguments:
+            path (Union[str, os.PathLike]): The file to write the tables to
+        """
+        # pylint: disable=import-outside-toplevel
+        import numpy as np
+
+        body = np.concatenate(
+            (self.heads_up.ravel(), self.versus_random.ravel())
+        ).astype("<f4").tobytes()
+        header = _FILE_HEADER.pack(_FILE_MAGIC, _FILE_VERSION, zlib.crc32(body), len(body))
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(header + body)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def from_file(cls, path: Union[str, os.PathLike]) -> PreflopEquity:
+        """
+        Memory maps the tables saved by :meth:`save`.
+
+        Arguments:
+            path (Union[str, os.PathLike]): The file to read the tables from
+        Returns:
+            PreflopEquity: Read-only tables backed by the file
+        Raises:
+            OSError: If the file cannot be opened
+            PreflopEquityFileError: If the file is not a valid table file of this version
+        """
+        with open(path, "rb") as file:
+            try:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as err:  # empty file
+                raise PreflopEquityFileError(f"Empty preflop equity file {path}") from err
+
+        size = NUM_CLASSES * (NUM_CLASSES + MAX_OPPONENTS) * 4
+        if len(mapping) != _FILE_HEADER.size + size:
+            raise PreflopEquityFileError(f"Preflop equity file {path} has the wrong size")
+
+        magic, version, checksum, _ = _FILE_HEADER.unpack(mapping[: _FILE_HEADER.size])
+        if magic != _FILE_MAGIC or version != _FILE_VERSION:
+            raise PreflopEquityFileError(
+                f"Preflop equity file {path} has version {version}, "
+                f"expected {_FILE_VERSION}"
+            )
+        if zlib.crc32(memoryview(mapping)[_FILE_HEADER.size :]) != checksum:
+            raise PreflopEquityFileError(f"Checksum mismatch in preflop equity file {path}")
+
+        # pylint: disable=import-outside-toplevel
+        import numpy as np
+
+        values = np.frombuffer(mapping, dtype="<f4", offset=_FILE_HEADER.size)
+        return cls(
+            heads_up=values[: NUM_CLASSES * NUM_CLASSES].reshape(NUM_CLASSES, NUM_CLASSES),
+            versus_random=values[NUM_CLASSES * NUM_CLASSES :].reshape(
+                NUM_CLASSES, MAX_OPPONENTS
+            ),
+        )
+
+
+_PREFLOP_EQUITY: Optional[PreflopEquity] = None
+_PREFLOP_EQUITY_LOADED = False
+
+
+def get_preflop_equity() -> Optional[PreflopEquity]:
+    """
+    Returns:
+        Optional[PreflopEquity]: The shared preflop tables, loaded from
+            PREFLOP_EQUITY_PATH on the first call, or None if they have not
+            been generated.
+    """
+    global _PREFLOP_EQUITY, _PREFLOP_EQUITY_LOADED  # pylint: disable=global-statement
+    if not _PREFLOP_EQUITY_LOADED:
+        _PREFLOP_EQUITY_LOADED = True
+        try:
+            _PREFLOP_EQUITY = PreflopEquity.from_file(PREFLOP_EQUITY_PATH)
+        except (OSError, PreflopEquityFileError):
+            _PREFLOP_EQUITY = None
+    return _PREFLOP_EQUITY
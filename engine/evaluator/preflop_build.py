@@ -0,0 +1,233 @@
+"""
+Generates the preflop equity tables read by :mod:`engine.evaluator.preflop`.
+
+Run once with::
+
+    python -m engine.evaluator.preflop_build --processes 8
+
+The heads-up matrix and the equity against one random hand are exact: every
+board is enumerated, up to suit isomorphism, and every starting hand is scored
+against every other on it. Against 2 to 9 random hands full enumeration is out
+of reach, so those columns are Monte Carlo estimates.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ProcessPoolExecutor
+from math import comb
+from typing import Optional
+import argparse
+import itertools
+import os
+
+import numpy as np
+
+from engine.card.card_index import from_indices
+from engine.card.card_set import masks_from_indices
+from engine.evaluator.isomorphism import canonical_boards
+from engine.evaluator.preflop import (
+    MAX_OPPONENTS,
+    NUM_CLASSES,
+    PREFLOP_EQUITY_PATH,
+    PreflopEquity,
+)
+
+
+def _combos() -> np.ndarray:
+    """
+    Returns:
+        np.ndarray: The 1326 starting hands as (1326, 2) deck indices, sorted by class
+    """
+    combos = np.array(list(itertools.combinations(range(52), 2)), dtype=np.int64)
+    classes = _combo_classes(combos)
+    return combos[np.argsort(classes, kind="stable")]
+
+
+def _combo_classes(combos: np.ndarray) -> np.ndarray:
+    """
+    The vectorized :func:`hand_class` of deck indices, see
+    :mod:`engine.card.card_index` for their order.
+    """
+    ranks, suits = combos // 4, combos % 4
+    high, low = ranks.max(axis=1), ranks.min(axis=1)
+    return np.where(suits[:, 0] == suits[:, 1], high * 13 + low, low * 13 + high)
+
+
+def _canonical_boards() -> tuple:
+    """
+    Reduces the C(52, 5) boards to one board per class of suit permutations.
+
+    Returns:
+        tuple: The (M, 5) canonical boards as deck indices and how many boards
+            each one stands for
+    """
+    boards, counts, _ = canonical_boards(5)
+    return boards, counts
+
+
+def _score_boards(boards: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Scores every starting hand against every other on each of the boards,
+    1 for a win and 1/2 for a tie, summed by class.
+
+    Arguments:
+        boards (np.ndarray): (M, 5) boards as deck indices
+        weights (np.ndarray): How many boards each one stands for
+    Returns:
+        np.ndarray: (169, 169) weighted score sums of class against class
+    """
+    # pylint: disable=import-outside-toplevel
+    from engine.evaluator.evaluator import evaluate_keys, index_keys
+
+    combos = _combos()
+    classes = _combo_classes(combos)
+    class_starts = np.flatnonzero(np.r_[True, classes[1:] != classes[:-1]])
+    combo_masks = masks_from_indices(combos)
+    combo_keys, combo_lanes = index_keys(combos)
+
+    # the 100 other starting hands sharing a card with each starting hand
+    shares_card = (combo_masks[:, None] & combo_masks[None, :]) != 0
+    np.fill_diagonal(shares_card, False)
+    overlaps = np.nonzero(shares_card)[1].reshape(len(combos), -1)
+
+    onehot = np.eye(NUM_CLASSES)[classes]
+    scores = np.zeros((NUM_CLASSES, NUM_CLASSES))
+    for board, weight in zip(boards, weights):
+        board_keys, board_lanes = index_keys(board[None, :])
+        live = (combo_masks & masks_from_indices(board)) == 0
+        ranks = evaluate_keys(combo_keys + board_keys, combo_lanes + board_lanes)
+
+        # rows[a, c]: hands of class c that a beats, plus half the ones it ties,
+        # from the live hands cumulated worst first by class
+        order = np.argsort(-np.where(live, ranks, 0), kind="stable")
+        order = order[: live.sum()]
+        worst_first = np.zeros((len(order) + 1, NUM_CLASSES))
+        np.cumsum(onehot[order], axis=0, out=worst_first[1:])
+        ascending = np.sort(ranks[live])
+        worse = len(order) - np.searchsorted(ascending, ranks, side="right")
+        worse_or_tied = len(order) - np.searchsorted(ascending, ranks, side="left")
+        rows = 0.5 * (worst_first[worse] + worst_first[worse_or_tied])
+        rows[np.arange(len(combos)), classes] -= 0.5  # the tie with itself
+        rows[~live] = 0
+
+        # hands sharing a card were counted but can't be dealt together
+        other_ranks = ranks[overlaps]
+        blocked = (live[:, None] & live[overlaps]) * (
+            (ranks[:, None] < other_ranks) + 0.5 * (ranks[:, None] == other_ranks)
+        )
+        blocked_by_class = np.bincount(
+            (classes[:, None] * NUM_CLASSES + classes[overlaps]).ravel(),
+            weights=blocked.ravel(),
+            minlength=NUM_CLASSES * NUM_CLASSES,
+        ).reshape(NUM_CLASSES, NUM_CLASSES)
+
+        scores += weight * (np.add.reduceat(rows, class_starts) - blocked_by_class)
+    return scores
+
+
+def _score_boards_star(args) -> np.ndarray:
+    """:func:`_score_boards` with packed arguments, for the process pool."""
+    return _score_boards(*args)
+
+
+def build_heads_up(processes: int = 1, chunk_size: int = 2000) -> tuple:
+    """
+    Enumerates every board and starting hand pair for the exact heads-up equities.
+
+    Arguments:
+        processes (int): How many processes to enumerate on, defaults to 1 (no pool)
+        chunk_size (int): How many canonical boards each task scores
+    Returns:
+        tuple: The (169, 169) class against class equities and the (169,) equities
+            against one random hand
+    """
+    boards, weights = _canonical_boards()
+    tasks = [
+        (boards[i : i + chunk_size], weights[i : i + chunk_size])
+        for i in range(0, len(boards), chunk_size)
+    ]
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            scores = sum(pool.map(_score_boards_star, tasks))
+    else:
+        scores = sum(map(_score_boards_star, tasks))
+
+    # each pair of disjoint starting hands sees C(48, 5) boards
+    combos = _combos()
+    classes = _combo_classes(combos)
+    combo_masks = masks_from_indices(combos)
+    disjoint = ((combo_masks[:, None] & combo_masks[None, :]) == 0).astype(np.float64)
+    onehot = np.eye(NUM_CLASSES)[classes]
+    matchups = onehot.T @ disjoint @ onehot * comb(48, 5)
+
+    return scores / matchups, scores.sum(axis=1) / matchups.sum(axis=1)
+
+
+def build_versus_random(
+    samples: int = 100_000, processes: int = 1, seed: Optional[int] = 0
+) -> np.ndarray:
+    """
+    Estimates the equity of every class against 2 to 9 random hands with
+    :func:`engine.equity.monte_carlo.monte_carlo_equity`.
+
+    Arguments:
+        samples (int): How many runouts to sample per class and opponent count
+        processes (int): How many processes to sample on, defaults to 1 (no pool)
+        seed (Optional[int]): The random seed, defaults to 0
+    Returns:
+        np.ndarray: (169, 8) equities against 2 to 9 random hands
+    """
+    # pylint: disable=import-outside-toplevel
+    from engine.equity.monte_carlo import monte_carlo_equity
+
+    combos = _combos()
+    classes = _combo_classes(combos)
+    representatives = combos[np.flatnonzero(np.r_[True, classes[1:] != classes[:-1]])]
+
+    equities = np.zeros((NUM_CLASSES, MAX_OPPONENTS - 1))
+    for hand_class_id, combo in enumerate(representatives):
+        hand = from_indices(combo.tolist())
+        for num_opponents in range(2, MAX_OPPONENTS + 1):
+            equities[hand_class_id, num_opponents - 2] = monte_carlo_equity(
+                hand,
+                num_opponents=num_opponents,
+                samples=samples,
+                processes=processes,
+                seed=None if seed is None else seed + hand_class_id * MAX_OPPONENTS,
+            ).equity
+    return equities
+
+
+def build_preflop_equity(
+    samples: int = 100_000, processes: int = 1, seed: Optional[int] = 0
+) -> PreflopEquity:
+    """
+    Arguments:
+        samples (int): How many runouts to sample per class against 2 to 9 hands
+        processes (int): How many processes to use, defaults to 1 (no pool)
+        seed (Optional[int]): The random seed for the sampled columns, defaults to 0
+    Returns:
+        PreflopEquity: Freshly generated tables
+    """
+    heads_up, versus_one = build_heads_up(processes)
+    versus_many = build_versus_random(samples, processes, seed)
+    return PreflopEquity(
+        heads_up=heads_up.astype(np.float32),
+        versus_random=np.column_stack((versus_one, versus_many)).astype(np.float32),
+    )
+
+
+def main():
+    """Generates the preflop equity file."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("--output", default=PREFLOP_EQUITY_PATH)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--samples", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    build_preflop_equity(args.samples, args.processes, args.seed).save(args.output)
+
+
+if __name__ == "__main__":
+    main()
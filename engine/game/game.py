@@ -1,24 +1,34 @@
 """
 The game module includes lightweight data classes:
+    - Seats
+        - The chips, state codes and last pots of every seat of a table,
+          in fixed-size lists indexed by seat.
     - Player
         - The player class keeps track of the chips, player_state,
-          last_pot, and player_id of the player.
+          last_pot, and player_id of the player, as a view of its seat.
     - Pot
         - The pot class represents a betting pot which players
           can post to. Includes helper functions and attributes that deal
           with split pots or how much a player needs to call.
+    - GameSnapshot
+        - The compact mutable state of a game, see :meth:`TexasHoldEm.snapshot`.
+    - LegalActions
+        - The actions a player can take, see :meth:`TexasHoldEm.legal_actions`.
 
 It also includes the main TexasHoldEm class of the texasholdem package.
 """
 
 from __future__ import annotations
 
+import copy
 import os
-from typing import Iterator, Callable, Dict, Tuple, Optional, Union, List
+from dataclasses import dataclass
+from typing import Any, FrozenSet, Iterable, Iterator, Dict, Tuple, Optional, Union, List
 from enum import Enum, auto
 import random
 
 from engine.card.card import Card
+from engine.card.deal_stream import DealStream
 from engine.card.deck import Deck
 from engine.game.history import (
     History,
@@ -32,6 +42,35 @@ from engine.game.action_type import ActionType
 from engine.game.hand_phase import HandPhase
 from engine.game.player_state import PlayerState
 from engine.evaluator import evaluator
+from engine.evaluator.hand_state import HandEvaluatorState
+
+
+# PlayerState values as the state codes of the table, players that can still
+# act (IN, TO_CALL) and active players (not OUT or SKIP) are ranges of codes
+_SKIP = PlayerState.SKIP.value
+_OUT = PlayerState.OUT.value
+_IN = PlayerState.IN.value
+_TO_CALL = PlayerState.TO_CALL.value
+_ALL_IN = PlayerState.ALL_IN.value
+_STATES: Tuple[Optional[PlayerState], ...] = (None,) + tuple(PlayerState)
+assert all(_STATES[state.value] is state for state in PlayerState)
+assert _SKIP < _OUT < _IN < _TO_CALL < _ALL_IN
+
+
+class Seats:
+    # pylint: disable=too-few-public-methods
+    """
+    The per-seat state of a table in fixed-size lists indexed by seat: the
+    chips, state codes (:class:`PlayerState` values) and last pots of every
+    player. The :class:`Player` objects are views of one seat.
+    """
+
+    __slots__ = ("chips", "states", "last_pots")
+
+    def __init__(self, num_seats: int, chips: int = 0):
+        self.chips: List[int] = [chips] * num_seats
+        self.states: List[int] = [_IN] * num_seats
+        self.last_pots: List[int] = [0] * num_seats
 
 
 class Player:
@@ -41,16 +80,49 @@ class Player:
         - Chip count
         - PlayerState
         - Which pots the player is in
+
+    The values live in the :class:`Seats` of the table, a player reads and
+    writes its own seat.
     """
 
-    def __init__(self, player_id, chips):
+    __slots__ = ("player_id", "_seats")
+
+    def __init__(self, player_id, chips, seats: Optional[Seats] = None):
         self.player_id = player_id
+        self._seats = seats if seats is not None else Seats(player_id + 1)
         self.chips = chips
         self.state = PlayerState.IN
 
         # invariant: last_pot is the newest pot that player is eligible for
         self.last_pot = 0
 
+    @property
+    def chips(self) -> int:
+        """The chip count of the player"""
+        return self._seats.chips[self.player_id]
+
+    @chips.setter
+    def chips(self, chips: int):
+        self._seats.chips[self.player_id] = chips
+
+    @property
+    def state(self) -> PlayerState:
+        """The PlayerState of the player"""
+        return _STATES[self._seats.states[self.player_id]]
+
+    @state.setter
+    def state(self, state: PlayerState):
+        self._seats.states[self.player_id] = state.value
+
+    @property
+    def last_pot(self) -> int:
+        """The newest pot the player is eligible for"""
+        return self._seats.last_pots[self.player_id]
+
+    @last_pot.setter
+    def last_pot(self, last_pot: int):
+        self._seats.last_pots[self.player_id] = last_pot
+
 
 class Pot:
     """
@@ -58,13 +130,34 @@ class Pot:
     If players post more than the raised amount, we set the new raised amount.
 
     At the end of a betting round, the bets are consolidated and reset.
+
+    The bets are kept in fixed-size lists indexed by seat: the bets of the
+    current round, everything posted this hand (kept when a player folds)
+    and which players are in the pot.
     """
 
-    def __init__(self):
+    __slots__ = ("amount", "raised", "bets", "posted", "in_pot")
+
+    def __init__(self, num_seats: int):
+        """
+        Arguments:
+            num_seats (int): The number of seats at the table
+        """
         self.amount = 0
         self.raised = 0
-        self.player_amounts = {}
-        self.player_amounts_without_remove = {}
+        self.bets: List[int] = [0] * num_seats
+        self.posted: List[int] = [0] * num_seats
+        self.in_pot: List[bool] = [False] * num_seats
+
+    @property
+    def player_amounts(self) -> Dict[int, int]:
+        """The bets of this round of every player in the pot"""
+        return {player_id: self.bets[player_id] for player_id in self.players_in_pot()}
+
+    @property
+    def player_amounts_without_remove(self) -> Dict[int, int]:
+        """The chips posted this hand by every seat, including players that folded"""
+        return dict(enumerate(self.posted))
 
     def __repr__(self):
         return {
@@ -84,7 +177,7 @@ class Pot:
               (this is just self.raised if the player hasn't bet yet)
 
         """
-        return self.raised - self.player_amounts.get(player_id, 0)
+        return self.raised - self.bets[player_id]
 
     def player_post(self, player_id: int, amount: int):
         """The given player posts amount into this pot. If player[player_id].amount > raised,
@@ -95,15 +188,13 @@ class Pot:
             amount (int): The amount to post into this pot
 
         """
-        self.player_amounts[player_id] = self.player_amounts.get(player_id, 0) + amount
+        self.in_pot[player_id] = True
+        self.bets[player_id] += amount
 
-        if self.player_amounts[player_id] > self.raised:
-            self.raised = self.player_amounts[player_id]
-        # print(self.raised, self.player_amounts)
+        if self.bets[player_id] > self.raised:
+            self.raised = self.bets[player_id]
 
-        self.player_amounts_without_remove[player_id] = (
-            self.player_amounts_without_remove.get(player_id, 0) + amount
-        )
+        self.posted[player_id] += amount
 
     def get_player_amount(self, player_id: int) -> int:
         """
@@ -113,7 +204,7 @@ class Pot:
             int: the amount the player has bet currently for this pot.
 
         """
-        return self.player_amounts.get(player_id, 0)
+        return self.bets[player_id]
 
     def players_in_pot(self) -> Iterator[int]:
         """
@@ -121,8 +212,7 @@ class Pot:
             Iterator[int]: An iterator over the player player_id's that have a stake in this pot.
 
         """
-
-        return iter(self.player_amounts.keys())
+        return (player_id for player_id, in_pot in enumerate(self.in_pot) if in_pot)
 
     def collect_bets(self):
         """
@@ -130,9 +220,8 @@ class Pot:
         the total amount. Resets player betting.
         """
         self.raised = 0
-        for player_id, player_amount in self.player_amounts.items():
-            self.amount += player_amount
-            self.player_amounts[player_id] = 0
+        self.amount += sum(self.bets)
+        self.bets = [0] * len(self.bets)
 
     def remove_player(self, player_id: int):
         """
@@ -143,10 +232,12 @@ class Pot:
             player_id (int): Player player_id
 
         """
-        if player_id not in self.player_amounts:
+        if not self.in_pot[player_id]:
             return
 
-        self.amount += self.player_amounts.pop(player_id)
+        self.amount += self.bets[player_id]
+        self.bets[player_id] = 0
+        self.in_pot[player_id] = False
 
     def get_amount(self) -> int:
         """
@@ -164,7 +255,7 @@ class Pot:
 
         """
 
-        return sum(self.player_amounts.values()) + self.get_amount()
+        return sum(self.bets) + self.amount
 
     def split_pot(self, raised_level: int) -> Optional[Pot]:
         """
@@ -178,17 +269,16 @@ class Pot:
         if self.raised <= raised_level:
             return None
 
-        split_pot = Pot()
+        split_pot = Pot(len(self.bets))
         self.raised = raised_level
 
         for player_id in self.players_in_pot():
             # player currently in last pot, post overflow to the split pot
-            if self.get_player_amount(player_id) > self.raised:
-                overflow = self.get_player_amount(player_id) - self.raised
+            if self.bets[player_id] > self.raised:
+                overflow = self.bets[player_id] - self.raised
                 split_pot.player_post(player_id, overflow)
-                self.player_amounts[player_id] -= overflow
-
-                self.player_amounts_without_remove[player_id] -= -overflow
+                self.bets[player_id] -= overflow
+                self.posted[player_id] -= overflow
 
         return split_pot
 
@@ -204,8 +294,87 @@ class GameState(Enum):
     of chips and unable to play hands."""
 
 
+@dataclass(frozen=True)
+class GameSnapshot:
+    # pylint: disable=too-many-instance-attributes
+    """
+    The mutable state of a :class:`TexasHoldEm` at one point of a hand, taken
+    with :meth:`TexasHoldEm.snapshot` and put back with :meth:`TexasHoldEm.restore`.
+    Nothing in it is changed by the game afterwards, so one snapshot can be
+    restored any number of times.
+    """
+
+    seats: Tuple[Tuple[int, ...], ...]
+    """The chips, state codes and last pots of every seat, see :class:`Seats`"""
+
+    pots: Tuple[Tuple[Any, ...], ...]
+    """(amount, raised, bets, posted, in_pot) of every pot"""
+
+    bet_totals: Tuple[Tuple[int, ...], ...]
+    """The running street bets, hand commitments, chips to call and chips at stake"""
+
+    table: Tuple[Any, ...]
+    """The button, blinds, current player, phases and counters"""
+
+    cards: Tuple[Any, ...]
+    """The deck, board, hands, community cards, hand scores and hand states"""
+
+    history: Optional[History]
+    """The hand history so far"""
+
+    buyins: Tuple[dict, dict]
+    """The buyin_history and total_buyin_history"""
+
+    duplicate: Tuple[Any, ...]
+    """The duplicate mode bookkeeping"""
+
+
+@dataclass(frozen=True)
+class LegalActions:
+    """
+    The actions a player can take at one decision. Raises are given as the
+    value of a RAISE, i.e. the amount the player has bet this round (across
+    all pots) after raising.
+    """
+
+    action_types: FrozenSet[ActionType] = frozenset()
+    """The legal action types, ALL_IN included if it translates to a legal move"""
+
+    min_raise: Optional[int] = None
+    """The smallest legal raise, None if the player cannot raise"""
+
+    max_raise: Optional[int] = None
+    """The largest legal raise (all in), None if the player cannot raise"""
+
+    def is_legal(self, action_type: ActionType, value: Optional[int] = None) -> bool:
+        """
+        Arguments:
+            action_type (ActionType): The ActionType to take
+            value (Optional[int]): In the case of raise, how much to raise
+        Returns:
+            bool: True if the move is legal, False o/w
+        """
+        if action_type not in self.action_types:
+            return False
+        if action_type == ActionType.RAISE:
+            return value is not None and self.min_raise <= value <= self.max_raise
+        return True
+
+    def mask(self, action_types: Iterable[ActionType]) -> List[bool]:
+        """
+        Arguments:
+            action_types (Iterable[ActionType]): The action types in the order of the mask
+        Returns:
+            List[bool]: For every action type, if it is legal
+        """
+        return [action_type in self.action_types for action_type in action_types]
+
+
+_NO_LEGAL_ACTIONS = LegalActions()
+
+
 class TexasHoldEm:
-    # pylint: disable=too-many-instance-attributes,stop-iteration-return
+    # pylint: disable=too-many-instance-attributes
 
     """
     Represents a table of TexasHoldEm (tournament style).
@@ -219,6 +388,10 @@ class TexasHoldEm:
     To input an action at each stage, call :meth:`TexasHoldEm.take_action` which will
     execute the given action for the current player.
 
+    The hand is a state machine over plain fields (the hand phase, the players
+    still to act and the last aggressor), so a game can be pickled and sent to
+    another process at any point, unless it deals from a :class:`DealStream`.
+
     """
 
     def __init__(
@@ -231,6 +404,9 @@ class TexasHoldEm:
         max_players=9,
         add_chips_when_lose=False,
         num_to_action=None,
+        report_all_in_ev=False,
+        deal_stream: Optional[DealStream] = None,
+        duplicate=False,
     ):
         """
         Arguments:
@@ -238,6 +414,14 @@ class TexasHoldEm:
             big_blind (int): Big blind
             small_blind (int): Small blind
             max_players (int): how many players can sit at the table, defaults to 9.
+            report_all_in_ev (bool): If the hand is settled before the river, fill
+                :attr:`all_in_ev` with the exact expected chips won, defaults to False.
+            deal_stream (Optional[DealStream]): Deal every hand from this stream
+                instead of a new :class:`Deck`, defaults to None.
+            duplicate (bool): Duplicate mode, every deal is replayed once per active
+                player with the button and the hands moved one seat further each
+                time and the stacks put back before every hand, defaults to False.
+                The average result of each deal is added to :attr:`duplicate_results`.
         """
         self.buyin = buyin
         self.big_blind = big_blind
@@ -249,9 +433,22 @@ class TexasHoldEm:
         self.num_to_action = num_to_action
 
         self.add_chips_when_lose = add_chips_when_lose
-
+        self.report_all_in_ev = report_all_in_ev
+        self.deal_stream = deal_stream
+
+        # duplicate mode: the deal being replayed and the stacks to put back
+        self.duplicate = duplicate
+        self.duplicate_replay = 0
+        self.duplicate_replays = 0
+        self.duplicate_results: List[Dict[int, float]] = []
+        self._duplicate_order: Optional[List[Card]] = None
+        self._duplicate_stacks: Optional[Tuple[List[int], dict, dict, int]] = None
+        self._duplicate_deltas: Dict[int, int] = {}
+
+        # the chips, states and last pots of every seat, see Seats
+        self._seats = Seats(max_players)
         self.players: list[Player] = list(
-            Player(i, self.buyin) for i in range(max_players)
+            Player(i, self.buyin, self._seats) for i in range(max_players)
         )
 
         self.buyin_history = {}
@@ -271,25 +468,32 @@ class TexasHoldEm:
         self.board = []
         self.hands = {}
         self.player_hand_scores = {}
+        self.hand_states: Dict[int, HandEvaluatorState] = {}
+        self.all_in_ev: Dict[int, float] = {}
 
         self.num_hands = 0
         self.hand_phase = HandPhase.PREHAND
         self.game_state = GameState.RUNNING
 
-        self._handstate_handler: Dict[
-            HandPhase, Callable[[], Optional[Iterator[TexasHoldEm]]]
-        ] = {
-            HandPhase.PREHAND: self._prehand,
-            HandPhase.PREFLOP: lambda: self._betting_round(HandPhase.PREFLOP),
-            HandPhase.FLOP: lambda: self._betting_round(HandPhase.FLOP),
-            HandPhase.TURN: lambda: self._betting_round(HandPhase.TURN),
-            HandPhase.RIVER: lambda: self._betting_round(HandPhase.RIVER),
-            HandPhase.SETTLE: self._settle,
-        }
-
         self.hand_history: Optional[History] = None
         self._action = None, None
-        self._hand_gen = None
+        self._legal_actions: Optional[LegalActions] = None
+
+        # running per-player totals over all pots, kept up to date by every post,
+        # fold, split and collection so that the queries don't sum over the pots:
+        # the bets this round, the chips put in this hand, the chips to call
+        # (see chips_to_call) and the chips at stake (see chips_at_stake)
+        self.street_bets: List[int] = [0] * max_players
+        self.hand_commitments: List[int] = [0] * max_players
+        self._to_call: List[int] = [0] * max_players
+        self._stakes: List[int] = [0] * max_players
+
+        # the betting round: the seats in turn to act (skipped when their turn
+        # comes if they cannot act anymore), the last player to raise and the
+        # first pot of the round
+        self._to_act: List[int] = []
+        self._last_aggressor: Optional[int] = None
+        self._first_pot = 0
 
     def _prehand(self):
         """
@@ -299,6 +503,9 @@ class TexasHoldEm:
         if self.hand_phase != HandPhase.PREHAND:
             raise ValueError("Not time for prehand!")
 
+        if self.duplicate:
+            self._restore_duplicate_stacks()
+
         # set statuses for players
         for player_id in self.player_iter(loc=0):
             self.players[player_id].last_pot = 0
@@ -327,7 +534,8 @@ class TexasHoldEm:
             self.game_state = GameState.STOPPED
             return
 
-        # change btn loc (at least 2 players)
+        # change btn loc (at least 2 players), in duplicate mode the button
+        # moving on is what rotates the seats from one replay to the next
         self.btn_loc = active_players[0]
         self.sb_loc = active_players[1]
 
@@ -338,28 +546,33 @@ class TexasHoldEm:
         self.bb_loc = next(self.active_iter(self.sb_loc + 1))
 
         # reset pots
-        self.pots = [Pot()]
+        self.pots = [Pot(self.max_players)]
         self.pots[0].amount = self.starting_pot
-
-        # populate the player_amounts_without_remove dict
-        self.pots[0].player_amounts_without_remove = {
-            i: 0 for i in range(self.max_players)
-        }
+        self._update_bet_totals()
 
         # deal cards
-        self._deck = Deck()
+        if self.duplicate:
+            self._deck = self._duplicate_deck(len(active_players))
+        else:
+            self._deck = self.deal_stream.next_deck() if self.deal_stream else Deck()
         self.community_cards = self._deck.community_cards.copy()
 
         self.hands = {}
         self.board = []
+        self.all_in_ev = {}
 
         for player_id in self.active_iter(self.btn_loc + 1):
             self.hands[player_id] = self._deck.draw(num=2)
 
+        # evaluated street by street as the board is dealt
+        self.hand_states = {
+            player_id: HandEvaluatorState(hand) for player_id, hand in self.hands.items()
+        }
+
         # evaluate every player's hands
         self.player_hand_scores = {}
         for player in self.players:
-            if player.state in (PlayerState.OUT, PlayerState.SKIP):
+            if self._seats.states[player.player_id] < _IN:
                 continue
             active_player_hand = self.hands[player.player_id]
             self.player_hand_scores[player.player_id] = evaluator.evaluate(
@@ -426,8 +639,9 @@ class TexasHoldEm:
         """
         if loc is None:
             loc = self.current_player
+        states = self._seats.states
         for player_id in self.player_iter(loc=loc, reverse=reverse):
-            if self.players[player_id].state not in (PlayerState.OUT, PlayerState.SKIP):
+            if states[player_id] >= _IN:
                 yield player_id
 
     def in_pot_iter(self, loc: int = None, reverse: bool = False) -> Iterator[int]:
@@ -444,8 +658,9 @@ class TexasHoldEm:
         """
         if loc is None:
             loc = self.current_player
-        for player_id in self.active_iter(loc=loc, reverse=reverse):
-            if self.players[player_id].state in (PlayerState.IN, PlayerState.TO_CALL):
+        states = self._seats.states
+        for player_id in self.player_iter(loc=loc, reverse=reverse):
+            if _IN <= states[player_id] <= _TO_CALL:
                 yield player_id
 
     def _split_pot(self, pot_id: int, raised_level: int):
@@ -465,11 +680,76 @@ class TexasHoldEm:
             return
 
         self.pots.insert(pot_id + 1, split_pot)
+        self._update_bet_totals()
 
         # increment last_pot for players with enough chips
+        seats = self._seats
         for player_id in self.in_pot_iter():
-            if self.players[player_id].chips > self.chips_to_call(player_id):
-                self.players[player_id].last_pot += 1
+            if seats.chips[player_id] > self._to_call[player_id]:
+                seats.last_pots[player_id] += 1
+                self._update_bet_totals([player_id])
+
+    def _post_to_pot(self, pot_id: int, player_id: int, amount: int):
+        """
+        The given player posts amount into the given pot, updating the running
+        per-player totals.
+
+        Arguments:
+            pot_id (int)            - The pot to post into
+            player_id (int)         - The player_id of the player posting
+            amount (int)            - The amount to post
+        """
+        pot = self._get_pot(pot_id)
+        raised = pot.raised
+        new_in_pot = not pot.in_pot[player_id]
+        pot.player_post(player_id, amount)
+
+        # everyone in the pot has the new chips at stake, a new player all of it
+        stakes = self._stakes
+        for pot_player_id in pot.players_in_pot():
+            stakes[pot_player_id] += amount
+        if new_in_pot:
+            stakes[player_id] += pot.get_total_amount() - amount
+
+        # a raise is to call for everyone eligible for the pot
+        last_pots = self._seats.last_pots
+        if pot.raised != raised:
+            for seat, last_pot in enumerate(last_pots):
+                if last_pot >= pot_id:
+                    self._to_call[seat] += pot.raised - raised
+        if last_pots[player_id] >= pot_id:
+            self._to_call[player_id] -= amount
+
+        self.street_bets[player_id] += amount
+        self.hand_commitments[player_id] += amount
+
+    def _update_bet_totals(self, player_ids: Optional[List[int]] = None):
+        """
+        Sums the running per-player totals over the pots again, after a change
+        that moves chips between pots (i.e. a split or a fold).
+
+        Arguments:
+            player_ids (Optional[List[int]]) - The players to update, defaults to all
+        """
+        if player_ids is None:
+            player_ids = range(self.max_players)
+            self.street_bets = [0] * self.max_players
+            self.hand_commitments = [0] * self.max_players
+            self._to_call = [0] * self.max_players
+            self._stakes = [0] * self.max_players
+
+        for player_id in player_ids:
+            self.street_bets[player_id] = sum(
+                pot.get_player_amount(player_id) for pot in self.pots
+            )
+            self.hand_commitments[player_id] = sum(pot.posted[player_id] for pot in self.pots)
+            self._to_call[player_id] = sum(
+                self.pots[i].chips_to_call(player_id)
+                for i in range(self._seats.last_pots[player_id] + 1)
+            )
+            self._stakes[player_id] = sum(
+                pot.get_total_amount() for pot in self.pots if pot.in_pot[player_id]
+            )
 
     def _player_post(self, player_id: int, amount: int):
         """
@@ -481,45 +761,43 @@ class TexasHoldEm:
             player_id (int) - The player_id of the player posting
             amount (int)	- The amount to post
         """
-        amount = min(self.players[player_id].chips, amount)
+        seats = self._seats
+        amount = min(seats.chips[player_id], amount)
         original_amount = amount
-        last_pot = self.players[player_id].last_pot
-        chips_to_call = self._get_pot(last_pot).chips_to_call(player_id)
+        last_pot = seats.last_pots[player_id]
+        pot = self._get_pot(last_pot)
+        chips_to_call = pot.chips_to_call(player_id)
 
         # if a player posts, they are in the pot
-        if amount == self.players[player_id].chips:
-            self.players[player_id].state = PlayerState.ALL_IN
+        if amount == seats.chips[player_id]:
+            seats.states[player_id] = _ALL_IN
         else:
-            self.players[player_id].state = PlayerState.IN
+            seats.states[player_id] = _IN
 
         # call in previous pots
         for i in range(last_pot):
             amount = amount - self._get_pot(i).chips_to_call(player_id)
-            self.pots[i].player_post(player_id, self.pots[i].chips_to_call(player_id))
+            self._post_to_pot(i, player_id, self.pots[i].chips_to_call(player_id))
 
-        self._get_pot(last_pot).player_post(player_id, amount)
+        self._post_to_pot(last_pot, player_id, amount)
 
         # players previously in pot need to call in event of a raise
         if amount > chips_to_call:
-            for pot_player_id in self._get_pot(last_pot).players_in_pot():
+            for pot_player_id in pot.players_in_pot():
                 if (
-                    self._get_pot(last_pot).chips_to_call(pot_player_id) > 0
-                    and self.players[pot_player_id].state == PlayerState.IN
+                    pot.chips_to_call(pot_player_id) > 0
+                    and seats.states[pot_player_id] == _IN
                 ):
-                    self.players[pot_player_id].state = PlayerState.TO_CALL
+                    seats.states[pot_player_id] = _TO_CALL
 
         # if a player is all_in in this pot, split a new one off
-        if PlayerState.ALL_IN in (
-            self.players[i].state for i in self._get_pot(last_pot).players_in_pot()
-        ):
-            raised_level = min(
-                self._get_pot(last_pot).get_player_amount(i)
-                for i in self._get_pot(last_pot).players_in_pot()
-                if self.players[i].state == PlayerState.ALL_IN
-            )
-            self._split_pot(last_pot, raised_level)
+        all_in_amounts = [
+            pot.bets[i] for i in pot.players_in_pot() if seats.states[i] == _ALL_IN
+        ]
+        if all_in_amounts:
+            self._split_pot(last_pot, min(all_in_amounts))
 
-        self.players[player_id].chips = self.players[player_id].chips - original_amount
+        seats.chips[player_id] = seats.chips[player_id] - original_amount
 
     def _get_pot(self, pot_id: int) -> Pot:
         """
@@ -558,11 +836,11 @@ class TexasHoldEm:
             bool: True if no more actions can be taken by the remaining players.
         """
         count = 0
-        for i in self.in_pot_iter():
-            if self.players[i].state == PlayerState.TO_CALL:
+        for state in self._seats.states:
+            if state == _TO_CALL:
                 return False
 
-            if self.players[i].state == PlayerState.IN:
+            if state == _IN:
                 count += 1
 
             if count > 1:
@@ -582,6 +860,21 @@ class TexasHoldEm:
 
         self.current_player = next(self.active_iter(loc=self.btn_loc + 1))
 
+        # expected chips won over every runout, before the runout is dealt
+        contested = [
+            (pot.get_total_amount(), list(pot.players_in_pot())) for pot in self.pots
+        ]
+        if (
+            self.report_all_in_ev
+            and len(self.board) < 5
+            and any(len(players) > 1 for _, players in contested)
+        ):
+            # imported here so importing the engine doesn't load the equity package
+            # pylint: disable=import-outside-toplevel
+            from engine.equity.exact import all_in_ev
+
+            self.all_in_ev = all_in_ev(contested, self.hands, self.board)
+
         for i, pot in enumerate(self.pots, 0):
             players_in_pot = list(pot.players_in_pot())
             # only player left in pot wins
@@ -601,6 +894,8 @@ class TexasHoldEm:
                 )
                 settle_history.new_cards.extend(new_cards)
                 self.board.extend(new_cards)
+                for hand_state in self.hand_states.values():
+                    hand_state.extend(new_cards)
 
             # use preevaluated hand scores here
             best_rank = min(self.player_hand_scores.values())
@@ -617,6 +912,68 @@ class TexasHoldEm:
             for player_id in winners:
                 self.players[player_id].chips += win_amount
 
+        if self.duplicate:
+            self._finish_duplicate_replay()
+
+    def _restore_duplicate_stacks(self):
+        """
+        Puts back the stacks, buyins and leftover pot of the first duplicate
+        deal, or saves them if this is the first one.
+        """
+        if self._duplicate_stacks is None:
+            self._duplicate_stacks = (
+                [player.chips for player in self.players],
+                self.buyin_history.copy(),
+                self.total_buyin_history.copy(),
+                self.starting_pot,
+            )
+            return
+
+        chips, buyin_history, total_buyin_history, starting_pot = self._duplicate_stacks
+        for player, player_chips in zip(self.players, chips):
+            player.chips = player_chips
+        self.buyin_history = buyin_history.copy()
+        self.total_buyin_history = total_buyin_history.copy()
+        self.starting_pot = starting_pot
+
+    def _duplicate_deck(self, num_active: int) -> Deck:
+        """
+        Arguments:
+            num_active (int): The number of players dealt in
+        Returns:
+            Deck: A deck dealing the current duplicate deal, starting a new deal
+                after the last replay
+        """
+        if self._duplicate_order is None:
+            deck = self.deal_stream.next_deck() if self.deal_stream else Deck()
+            self._duplicate_order = deck.community_cards + deck.cards
+            self.duplicate_replay = 0
+            self.duplicate_replays = num_active
+            self._duplicate_deltas = {i: 0 for i in range(self.max_players)}
+        return Deck.from_order(self._duplicate_order)
+
+    def _finish_duplicate_replay(self):
+        """
+        Adds up the chips won in this replay, and the average over all of them
+        to :attr:`duplicate_results` after the last replay of the deal.
+        """
+        starting_chips = self.hand_history.prehand.player_chips
+        for player in self.players:
+            self._duplicate_deltas[player.player_id] += (
+                player.chips - starting_chips[player.player_id]
+            )
+
+        self.duplicate_replay += 1
+        if self.duplicate_replay == self.duplicate_replays:
+            self.duplicate_results.append(
+                {
+                    player_id: delta / self.duplicate_replays
+                    for player_id, delta in self._duplicate_deltas.items()
+                }
+            )
+            self._duplicate_order = None
+            self.duplicate_replay = 0
+
     def chips_to_call(self, player_id: int) -> int:
         """
         Arguments:
@@ -625,10 +982,7 @@ class TexasHoldEm:
             int: The amount of chips the player needs to call in all pots
                 to play the hand.
         """
-        return sum(
-            self._get_pot(i).chips_to_call(player_id)
-            for i in range(self.players[player_id].last_pot + 1)
-        )
+        return self._to_call[player_id]
 
     def player_bet_amount(self, player_id: int) -> int:
         """
@@ -638,9 +992,7 @@ class TexasHoldEm:
             int: The amount of chips the player bet this round across all
                 pots.
         """
-        return sum(
-            self._get_pot(i).get_player_amount(player_id) for i in range(len(self.pots))
-        )
+        return self.street_bets[player_id]
 
     def chips_at_stake(self, player_id: int) -> int:
         """
@@ -649,11 +1001,53 @@ class TexasHoldEm:
         Returns:
             int - The amount of chips the player is eligible to win
         """
-        return sum(
-            self._get_pot(i).get_total_amount()
-            for i in range(len(self.pots))
-            if player_id in self._get_pot(i).players_in_pot()
-        )
+        return self._stakes[player_id]
+
+    def legal_actions(self, player_id: int) -> LegalActions:
+        """
+        The legal actions of the given player, computed once per decision and
+        cached until the game moves on.
+
+        Arguments:
+            player_id (int): The player player_id
+        Returns:
+            LegalActions: The legal action types and raise range, nothing is
+                legal if it is not the player's turn
+        """
+        if player_id != self.current_player or not self.is_hand_running():
+            return _NO_LEGAL_ACTIONS
+        if self._legal_actions is not None:
+            return self._legal_actions
+
+        chips = self._seats.chips[player_id]
+        state = self._seats.states[player_id]
+        player_amount = self.street_bets[player_id]
+        chips_to_call = self._to_call[player_id]
+        raised_level = self._get_pot(self._seats.last_pots[player_id]).raised
+
+        action_types = {ActionType.FOLD}
+        if state == _TO_CALL:
+            action_types.add(ActionType.CALL)
+        if state == _IN:
+            action_types.add(ActionType.CHECK)
+
+        # a raise has to reach the raised level plus the big blind, unless all in
+        max_raise = player_amount + chips
+        min_raise = max(min(raised_level + self.big_blind, max_raise), chips_to_call)
+        if min_raise > max_raise:
+            min_raise = max_raise = None
+        else:
+            action_types.add(ActionType.RAISE)
+
+        # ALL_IN is a CALL or a raise to max_raise, see _translate_allin
+        if chips <= chips_to_call:
+            if ActionType.CALL in action_types:
+                action_types.add(ActionType.ALL_IN)
+        elif ActionType.RAISE in action_types:
+            action_types.add(ActionType.ALL_IN)
+
+        self._legal_actions = LegalActions(frozenset(action_types), min_raise, max_raise)
+        return self._legal_actions
 
     def validate_move(
         self, player_id: int, action: ActionType, value: Optional[int] = None
@@ -672,37 +1066,7 @@ class TexasHoldEm:
         if not isinstance(action, ActionType):
             action = self.num_to_action[action]
 
-        # ALL_IN should be translated
-        new_action, new_value = action, value
-        if new_action == ActionType.ALL_IN:
-            new_action, new_value = self._translate_allin(new_action, new_value)
-
-        player_amount = self.player_bet_amount(player_id)
-        chips_to_call = self.chips_to_call(player_id)
-        raised_level = self._get_pot(self.players[player_id].last_pot).raised
-
-        # Check if player player_id is current player
-        if self.current_player != player_id:
-            return False
-
-        if new_action == ActionType.CALL:
-            return self.players[player_id].state == PlayerState.TO_CALL
-        if new_action == ActionType.CHECK:
-            return self.players[player_id].state == PlayerState.IN
-        if new_action == ActionType.RAISE:
-            return not (
-                new_value is None
-                or (
-                    new_value < raised_level + self.big_blind
-                    and new_value < player_amount + self.players[player_id].chips
-                )
-                or player_amount + self.players[player_id].chips < new_value
-                or new_value < chips_to_call
-            )
-        if new_action == ActionType.FOLD:
-            return True
-
-        return False
+        return self.legal_actions(player_id).is_legal(action, value)
 
     def _safe_execute(
         self, player_id: int, action: ActionType, value: Optional[int] = None
@@ -736,9 +1100,10 @@ class TexasHoldEm:
         elif action == ActionType.RAISE:
             self._player_post(player_id, value - player_amount)
         elif action == ActionType.FOLD:
-            self.players[player_id].state = PlayerState.OUT
-            for i in range(self.players[player_id].last_pot + 1):
+            self._seats.states[player_id] = _OUT
+            for i in range(self._seats.last_pots[player_id] + 1):
                 self.pots[i].remove_player(player_id)
+            self._update_bet_totals([player_id])
         else:
             return False
 
@@ -765,17 +1130,31 @@ class TexasHoldEm:
             + self.players[self.current_player].chips,
         )
 
-    def _betting_round(self, hand_phase: HandPhase) -> Iterator[TexasHoldEm]:
+    def _next_to_act(self) -> Optional[int]:
         """
-        Core round of the poker game. Executes actions from each active player
-        until everyone "checks"
+        Takes players off the front of :attr:`_to_act` until one of them can still
+        take an action (i.e. has state IN or TO_CALL when their turn comes).
 
-        Arguments:
-            hand_phase (HandPhase) - Which betting round phase to execute
-        Raises:
-            ValueError             - If self.hand_state is not a valid betting round
+        Returns:
+            Optional[int]: The player, or None if everyone has acted
         """
+        to_act = self._to_act
+        states = self._seats.states
+        while to_act:
+            player_id = to_act.pop(0)
+            if _IN <= states[player_id] <= _TO_CALL:
+                return player_id
+        return None
 
+    def _start_betting_round(self):
+        """
+        Deals the new cards of the current betting round and queues every seat to
+        act, starting with the current player preflop and left of the button after.
+
+        Raises:
+            ValueError             - If self.hand_phase is not a valid betting round
+        """
+        hand_phase = self.hand_phase
         if hand_phase not in (
             HandPhase.PREFLOP,
             HandPhase.FLOP,
@@ -784,11 +1163,6 @@ class TexasHoldEm:
         ):
             raise ValueError("Not valid betting round!")
 
-        if hand_phase != self.hand_phase:
-            raise ValueError(
-                f"Hand phase mismatch: expected {self.hand_phase}, got {hand_phase}"
-            )
-
         # add new cards to the board
         new_cards = self._deck.draw(
             num=hand_phase.new_cards(), draw_from_community=True
@@ -797,50 +1171,83 @@ class TexasHoldEm:
             new_cards=new_cards, actions=[]
         )
         self.board.extend(new_cards)
+        for hand_state in self.hand_states.values():
+            hand_state.extend(new_cards)
 
         # player to the left of the button starts
         if hand_phase != HandPhase.PREFLOP:
             self.current_player = next(self.active_iter(loc=self.btn_loc + 1))
 
-        first_pot = self._last_pot_id()
-        player_iter = self.in_pot_iter(self.current_player)
+        self._first_pot = self._last_pot_id()
+        self._to_act = list(self.player_iter(self.current_player))
+        self._last_aggressor = None
 
-        while not self._is_hand_over():
-            try:
-                self.current_player = next(player_iter)
-            except StopIteration:
-                break
+    def _end_betting_round(self):
+        """Consolidates the betting of all pots in this betting round."""
+        for i in range(self._first_pot, len(self.pots)):
+            self._get_pot(i).collect_bets()
+        self._update_bet_totals()
 
-            yield self
+    def _start_phase(self):
+        """
+        Starts the current hand phase, or settles the hand if no more actions can
+        be taken.
+        """
+        if self._is_hand_over():
+            self.hand_phase = HandPhase.SETTLE
 
-            action, val = self._translate_allin(*self._action)
-            passed = self._safe_execute(self.current_player, action, val)
+        if self.hand_phase == HandPhase.SETTLE:
+            self._settle()
+            self.hand_phase = self.hand_phase.next_phase()
+        else:
+            self._start_betting_round()
 
-            if not passed:
-                raise ValueError(
-                    f"Invalid move for player {self.current_player}: "
-                    f"{action}, {val}"
-                )
+    def _advance(self):
+        """
+        Moves the hand on until a player has to act or the hand is settled.
+        Core loop of the poker game: a betting round takes actions from each active
+        player until everyone "checks", then the next phase starts.
+        """
+        while self.is_hand_running():
+            if not self._is_hand_over():
+                player_id = self._next_to_act()
+                if player_id is not None:
+                    self.current_player = player_id
+                    return
 
-            betting_history = self.hand_history[self.hand_phase]
-            betting_history.actions.append(
-                PlayerAction(
-                    player_id=self.current_player, action_type=action, value=val
-                )
-            )
+            self._end_betting_round()
+            self.hand_phase = self.hand_phase.next_phase()
+            self._start_phase()
 
-            # On raise, everyone eligible gets to take another action
-            if action == ActionType.RAISE:
-                player_iter = self.in_pot_iter(self.current_player)
+    def _execute_action(self, action_type: ActionType, value: Optional[int] = None):
+        """
+        Executes the action of the current player, records it and, on a raise,
+        queues everyone eligible to take another action.
 
-                # Throwaway current player
-                # Edge case: _in_pot_iter already excludes ALL_IN
-                if self.players[self.current_player].state != PlayerState.ALL_IN:
-                    next(player_iter)
+        Raises:
+            ValueError             - If the move is invalid
+        """
+        action, val = self._translate_allin(action_type, value)
+        passed = self._safe_execute(self.current_player, action, val)
 
-        # consolidate betting to all pots in this betting round
-        for i in range(first_pot, len(self.pots)):
-            self._get_pot(i).collect_bets()
+        if not passed:
+            raise ValueError(
+                f"Invalid move for player {self.current_player}: "
+                f"{action}, {val}"
+            )
+
+        betting_history = self.hand_history[self.hand_phase]
+        betting_history.actions.append(
+            PlayerAction(
+                player_id=self.current_player, action_type=action, value=val
+            )
+        )
+
+        # On raise, everyone eligible gets to take another action
+        # (the raiser comes last in the queue, and has acted or is ALL_IN)
+        if action == ActionType.RAISE:
+            self._last_aggressor = self.current_player
+            self._to_act = list(self.player_iter(self.current_player + 1))[:-1]
 
     def get_hand(self, player_id) -> list[Card]:
         """
@@ -864,18 +1271,15 @@ class TexasHoldEm:
             raise ValueError("In the middle of a hand!")
 
         self.hand_phase = HandPhase.PREHAND
-        self._handstate_handler[self.hand_phase]()
+        self._legal_actions = None
+        self._prehand()
 
         if self.game_state == GameState.STOPPED:
             return
 
         self.hand_phase = self.hand_phase.next_phase()
-        self._hand_gen = self._hand_iter()
-
-        try:
-            next(self._hand_gen)
-        except StopIteration:
-            pass
+        self._start_phase()
+        self._advance()
 
     def take_action(self, action_type: ActionType, value: Optional[int] = None):
         """
@@ -897,40 +1301,181 @@ class TexasHoldEm:
             raise ValueError(f"Move is invalid!{action_type} - {value}")
 
         self._action = (action_type, value)
+        self._execute_action(action_type, value)
+        self._legal_actions = None
+        self._advance()
 
-        try:
-            next(self._hand_gen)
-        except StopIteration:
-            pass
-
-    def _hand_iter(self) -> Iterator[TexasHoldEm]:
+    def snapshot(self) -> GameSnapshot:
         """
+        Copies the mutable state of the game: chips, player states, pots, cards,
+        deck position, phase and history. Nothing is deep copied, the cards and
+        the recorded actions are never changed, so they are shared.
+
         Returns:
-            (Iterator[TexasHoldEm])	- A generator over every intermediate game state.
-                                      i.e. right before every action.
+            GameSnapshot: The state to give to :meth:`restore`
+        """
+        return GameSnapshot(
+            seats=(
+                tuple(self._seats.chips),
+                tuple(self._seats.states),
+                tuple(self._seats.last_pots),
+            ),
+            pots=tuple(
+                (pot.amount, pot.raised, tuple(pot.bets), tuple(pot.posted), tuple(pot.in_pot))
+                for pot in self.pots
+            ),
+            bet_totals=(
+                tuple(self.street_bets),
+                tuple(self.hand_commitments),
+                tuple(self._to_call),
+                tuple(self._stakes),
+            ),
+            table=(
+                self.btn_loc,
+                self.sb_loc,
+                self.bb_loc,
+                self.current_player,
+                self.hand_phase,
+                self.game_state,
+                self.starting_pot,
+                self.num_hands,
+                self.game_restarts,
+                self._action,
+                tuple(self._to_act),
+                self._last_aggressor,
+                self._first_pot,
+            ),
+            cards=(
+                self._deck.copy() if self._deck is not None else None,
+                tuple(self.board),
+                self.hands.copy(),
+                getattr(self, "community_cards", None),
+                self.player_hand_scores.copy(),
+                {
+                    player_id: hand_state.copy()
+                    for player_id, hand_state in self.hand_states.items()
+                },
+                self.all_in_ev,
+            ),
+            history=self.hand_history.copy() if self.hand_history is not None else None,
+            buyins=(self.buyin_history.copy(), self.total_buyin_history.copy()),
+            duplicate=(
+                self.duplicate_replay,
+                self.duplicate_replays,
+                tuple(self.duplicate_results),
+                self._duplicate_order,
+                self._duplicate_stacks,
+                self._duplicate_deltas.copy(),
+            ),
+        )
+
+    def restore(self, snapshot: GameSnapshot):
+        """
+        Puts the game back into the state of the snapshot, i.e. to search over
+        the actions from a state, play each one and restore before the next.
+
+        Arguments:
+            snapshot (GameSnapshot): A snapshot of this game (or of one with the same
+                number of players) from :meth:`snapshot`
         Raises:
-            (ValueError)            - If phase != PREFLOP
+            ValueError: If the snapshot has a different number of players
         """
-        if self.hand_phase != HandPhase.PREFLOP:
-            raise ValueError("Cannot iterate over hand: not time for PREFLOP")
+        chips, states, last_pots = snapshot.seats
+        if len(chips) != self.max_players:
+            raise ValueError(
+                f"Snapshot of {len(chips)} players, the game has {self.max_players}"
+            )
 
-        while self.is_hand_running():
-            if self._is_hand_over():
-                self.hand_phase = HandPhase.SETTLE
+        self._seats.chips[:] = chips
+        self._seats.states[:] = states
+        self._seats.last_pots[:] = last_pots
 
-            round_iter: Optional[Iterator[TexasHoldEm]] = self._handstate_handler[
-                self.hand_phase
-            ]()
-            if round_iter:
-                yield from round_iter
+        self.pots = []
+        for amount, raised, bets, posted, in_pot in snapshot.pots:
+            pot = Pot(self.max_players)
+            pot.amount, pot.raised = amount, raised
+            pot.bets, pot.posted, pot.in_pot = list(bets), list(posted), list(in_pot)
+            self.pots.append(pot)
+
+        street_bets, hand_commitments, to_call, stakes = snapshot.bet_totals
+        self.street_bets = list(street_bets)
+        self.hand_commitments = list(hand_commitments)
+        self._to_call = list(to_call)
+        self._stakes = list(stakes)
+
+        (
+            self.btn_loc,
+            self.sb_loc,
+            self.bb_loc,
+            self.current_player,
+            self.hand_phase,
+            self.game_state,
+            self.starting_pot,
+            self.num_hands,
+            self.game_restarts,
+            self._action,
+            to_act,
+            self._last_aggressor,
+            self._first_pot,
+        ) = snapshot.table
+        self._to_act = list(to_act)
+        self._legal_actions = None
+
+        deck, board, hands, community_cards, scores, hand_states, ev = snapshot.cards
+        self._deck = deck.copy() if deck is not None else None
+        self.board = list(board)
+        self.hands = hands.copy()
+        if community_cards is not None:
+            self.community_cards = community_cards
+        self.player_hand_scores = scores.copy()
+        self.hand_states = {
+            player_id: hand_state.copy() for player_id, hand_state in hand_states.items()
+        }
+        self.all_in_ev = ev
 
-            self.hand_phase = self.hand_phase.next_phase()
+        self.hand_history = (
+            snapshot.history.copy() if snapshot.history is not None else None
+        )
+        self.buyin_history = snapshot.buyins[0].copy()
+        self.total_buyin_history = snapshot.buyins[1].copy()
+
+        (
+            self.duplicate_replay,
+            self.duplicate_replays,
+            duplicate_results,
+            self._duplicate_order,
+            self._duplicate_stacks,
+            duplicate_deltas,
+        ) = snapshot.duplicate
+        self.duplicate_results = list(duplicate_results)
+        self._duplicate_deltas = duplicate_deltas.copy()
+
+    def clone(self) -> TexasHoldEm:
+        """
+        Returns:
+            TexasHoldEm: An independent game in the same state, playing on from
+                where this one is. The settings and the deal stream are shared.
+        """
+        game = copy.copy(self)
+        game._seats = Seats(self.max_players)  # pylint: disable=protected-access
+        game.players = [
+            Player(player.player_id, 0, game._seats)  # pylint: disable=protected-access
+            for player in self.players
+        ]
+        game.restore(self.snapshot())
+        return game
 
     def reset_game(self):
         ## Set all chips to normal -> 500
         ## set buyin_histories back to zeros
         self.game_restarts += 1
         self.game_state = GameState.RUNNING
+        self._legal_actions = None
+
+        # a new game starts over with a new deal and stacks
+        self._duplicate_order = None
+        self._duplicate_stacks = None
+        self.duplicate_replay = 0
 
         for player in self.players:
             player.chips = self.buyin
@@ -1029,6 +1574,7 @@ class TexasHoldEm:
         # give players old cards
         for i in game.player_iter():
             game.hands[i] = history.prehand.player_cards[i]
+            game.hand_states[i] = HandEvaluatorState(game.hands[i])
 
         # swap decks
         game._deck = deck
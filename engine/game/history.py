@@ -315,6 +315,28 @@ class History:
             if history_item is not None:
                 return history_item
 
+    def copy(self) -> History:
+        """
+        Returns:
+            History: A copy that the game can keep appending to without changing
+                this one. The prehand and the actions are shared, they are never
+                changed once recorded.
+        """
+        history = History(prehand=self.prehand)
+        for hand_phase in (HandPhase.PREFLOP, HandPhase.FLOP, HandPhase.TURN, HandPhase.RIVER):
+            betting_round = self[hand_phase]
+            if betting_round is not None:
+                history[hand_phase] = BettingRoundHistory(
+                    new_cards=list(betting_round.new_cards),
+                    actions=list(betting_round.actions),
+                )
+        if self.settle is not None:
+            history.settle = SettleHistory(
+                new_cards=list(self.settle.new_cards),
+                pot_winners=dict(self.settle.pot_winners),
+            )
+        return history
+
     def to_string(self) -> str:
         """
         Returns the string representation of the hand history, including the blind sizes,
@@ -9,13 +9,14 @@ from gym import spaces, Env
 from gui import Window
 
 from engine import TexasHoldEm
+from engine.card.deal_stream import DealStream
 from engine.game.game import Player
 from engine.gui.text_gui import TextGUI
 from engine.game.hand_phase import HandPhase
 from engine.game.action_type import ActionType
 from engine.game.history import PrehandHistory
-from engine.evaluator.evaluator import evaluate
 from engine.game.player_state import PlayerState
+from engine.evaluator.hand_strength import hand_strength
 from agent import RandomAgent, CrammerAgent, RLAgent
 from utils.flatten import flatten_spaces, flatten_array
 
@@ -77,6 +78,13 @@ class PokerEnv(Env):
         }
         self.card_num_to_int = {"T": 9, "J": 10, "Q": 11, "K": 12, "A": 13}
 
+        # deals from pre-shuffled batches, reproducible with deal_seed
+        self.deal_stream = (
+            DealStream(seed=env_constants.get("deal_seed"))
+            if env_constants.get("deal_stream", False)
+            else None
+        )
+
         self.game = TexasHoldEm(
             buyin=self.buy_in,
             buyin_limit=self.buyin_limit,
@@ -86,7 +94,11 @@ class PokerEnv(Env):
             agent_id=self.agent_id,
             add_chips_when_lose=False,
             num_to_action=self.num_to_action,
+            report_all_in_ev=env_constants.get("report_all_in_ev", False),
+            deal_stream=self.deal_stream,
+            duplicate=env_constants.get("duplicate", False),
         )
+        self.duplicate_deals = 0
 
         # step function
         self.current_agent_action = None
@@ -117,6 +129,11 @@ class PokerEnv(Env):
         self.hand_score_reward_multiplier = env_constants[
             "hand_score_reward_multiplier"
         ]
+        # HS, PPOT, NPOT and EHS in place of the raw hand score
+        self.hand_strength_features = env_constants.get("hand_strength_features", False)
+        self.hand_strength_resolution = env_constants.get(
+            "hand_strength_resolution", 1000
+        )
         card_space = spaces.Tuple((spaces.Discrete(14), spaces.Discrete(5)))
         obs_space = spaces.Dict(
             {
@@ -151,6 +168,11 @@ class PokerEnv(Env):
                 ),  # our hand's score
             }
         )
+        if self.hand_strength_features:
+            del obs_space.spaces["hand_score"]
+            obs_space.spaces["hand_strength"] = spaces.Tuple(
+                (spaces.Discrete(self.hand_strength_resolution + 1),) * 4
+            )  # our hand's HS, PPOT, NPOT, EHS
 
         self.observation_space = flatten_spaces(obs_space)
 
@@ -219,9 +241,7 @@ class PokerEnv(Env):
         if self.game.hand_phase != HandPhase.PREHAND and self.game.players[
             player_id
         ].state not in (PlayerState.OUT, PlayerState.SKIP):
-            hand_score = self.max_hand_score - evaluate(
-                self.game.hands[player_id], self.game.board
-            )
+            hand_score = self.max_hand_score - self.game.hand_states[player_id].rank
         # print(
         #     "hs:",
         #     hand_score,
@@ -235,26 +255,35 @@ class PokerEnv(Env):
             return hand_score / (self.max_hand_score // 2) - 1
         return round(hand_score * self.hand_score_multiplier)
 
-    def get_pot_commits(self):
-        pot_commits = self.default_pot_commit.copy()
-        stage_pot_commits = self.default_pot_commit.copy()
+    def get_player_hand_strength(self, player_id=None):
+        if player_id is None:
+            player_id = self.agent_id
 
-        for pot in self.game.pots:
-            player_amount = pot.player_amounts_without_remove
-            stage_amount = pot.player_amounts
+        if self.game.hand_phase == HandPhase.PREHAND or self.game.players[
+            player_id
+        ].state in (PlayerState.OUT, PlayerState.SKIP):
+            return (0,) * 4
 
-            for player_id in player_amount:
-                if player_id in pot_commits:
-                    pot_commits[player_id] += player_amount[player_id]
-                else:
-                    pot_commits[player_id] = player_amount[player_id]
+        features = hand_strength(self.game.hands[player_id], self.game.board)
+        return tuple(
+            round(feature * self.hand_strength_resolution)
+            for feature in (features.hs, features.ppot, features.npot, features.ehs)
+        )
 
-                if player_id in stage_pot_commits:
-                    stage_pot_commits[player_id] += stage_amount.get(player_id, 0)
-                else:
-                    stage_pot_commits[player_id] = (
-                        stage_amount[player_id] if stage_amount.get(player_id, 0) else 0
-                    )
+    def get_action_mask(self):
+        # legal actions of our agent, in the order of num_to_action
+        legal_actions = self.game.legal_actions(self.agent_id)
+        return {
+            "action_mask": np.array(
+                legal_actions.mask(self.num_to_action.values()), dtype=bool
+            ),
+            "raise_range": (legal_actions.min_raise, legal_actions.max_raise),
+        }
+
+    def get_pot_commits(self):
+        # running totals kept by the game: chips put in this hand / this stage
+        pot_commits = dict(enumerate(self.game.hand_commitments))
+        stage_pot_commits = dict(enumerate(self.game.street_bets))
         return pot_commits, stage_pot_commits
 
     def get_reward(self, pot_commits: dict):
@@ -439,7 +468,9 @@ class PokerEnv(Env):
                     sum([x.amount for x in self.game.pots]),
                     tuple(pot_commits.values()),
                     tuple(stage_pot_commits.values()),
-                    self.get_player_hand_score(),
+                    self.get_player_hand_strength()
+                    if self.hand_strength_features
+                    else self.get_player_hand_score(),
                 ]
             )
         )
@@ -474,12 +505,11 @@ class PokerEnv(Env):
             val = None
 
         # check valid action
-        if not self.game.validate_move(current_player.player_id, action, val):
+        legal_actions = self.game.legal_actions(current_player.player_id)
+        if not legal_actions.is_legal(action, val):
             action = (
                 ActionType.CHECK
-                if self.game.validate_move(
-                    current_player.player_id, ActionType.CHECK, None
-                )
+                if legal_actions.is_legal(ActionType.CHECK)
                 else ActionType.FOLD
             )
             val = None
@@ -541,7 +571,14 @@ class PokerEnv(Env):
         if not get_all_rewards:
             reward = reward[self.agent_id]
 
-        info = {"winners": self.get_winners()}
+        info = {"winners": self.get_winners(), **self.get_action_mask()}
+        if done and self.game.all_in_ev:
+            # exact expected chips next to the sampled runout
+            info["all_in_ev"] = self.game.all_in_ev
+        if done and len(self.game.duplicate_results) > self.duplicate_deals:
+            # the deal was played from every seat, its average chips won
+            self.duplicate_deals = len(self.game.duplicate_results)
+            info["duplicate_result"] = self.game.duplicate_results[-1][self.agent_id]
 
         self.total_steps += 1
         if self.total_steps % 3000 == 0:
@@ -611,6 +648,10 @@ class PokerEnv(Env):
                 if not self.game.is_game_running():
                     self.reset_game()
 
+        # duplicate mode puts the stacks back when the hand starts
+        if self.game.duplicate:
+            self.previous_chips.update(self.game.hand_history.prehand.player_chips)
+
         if self.use_gui:
             self.gui.print_state(self.game)
 
@@ -645,6 +686,8 @@ class PokerEnv(Env):
             f"\nactions:\n{pprint.pformat(self.action_dict)}",
             "\n",
         )
+        if self.deal_stream is not None:
+            self.deal_stream.close()
 
 
 def main(n_games=1, show_gui=True):